@@ -0,0 +1,338 @@
+"""
+Headless benchmark of lfs_file_locking.py against a local stand-in for the LFS lock server
+(lfs_lock_server.py) and a throwaway repo. Needs git and git-lfs, runs without Blender.
+Reports wall time, main thread time, git processes and server requests per operation.
+
+    python benchmarks/bench_lfs.py --theirs 5000 --latency 0.1 --output result.json
+    python benchmarks/bench_lfs.py --error-rate 0.1 --compare result.json
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+
+import bench_loader
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ADDON = os.path.join(REPO_ROOT, "blender_addons", "bpl_auto_load", "stand_alone", "lfs_file_locking.py")
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lfs_lock_server.py")
+SCHEMA_VERSION = 1
+
+
+class CountingSubprocess(types.ModuleType):
+    """Takes the place of subprocess inside the add-on and counts the processes it starts"""
+
+    def __init__(self):
+        super().__init__("subprocess")
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def __getattr__(self, name: str):
+        return getattr(subprocess, name)
+
+    def __count(self) -> None:
+        with self.lock:
+            self.calls += 1
+
+    def run(self, *args, **kwargs):
+        self.__count()
+        return subprocess.run(*args, **kwargs)
+
+    def Popen(self, *args, **kwargs): # pylint: disable=invalid-name
+        self.__count()
+        return subprocess.Popen(*args, **kwargs)
+
+
+def load_addon(path: str):
+    """Imports the add-on, the loader has to be loaded already since it imports it"""
+    spec = importlib.util.spec_from_file_location("lfs_file_locking", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.subprocess = CountingSubprocess()
+    return module
+
+
+def git(args: list[str], cwd: str) -> str:
+    return subprocess.check_output(["git"] + args, cwd=cwd, stderr=subprocess.STDOUT).decode().strip()
+
+
+class LockServer:
+    """lfs_lock_server.py in its own process, so it doesn't compete for the GIL with the add-on"""
+
+    def __init__(self, args):
+        self.process = subprocess.Popen(
+            [sys.executable, SERVER, "--latency", str(args.latency), "--jitter", str(args.jitter),
+             "--error-rate", str(args.error_rate), "--seed", str(args.seed)],
+            stdout=subprocess.PIPE, text=True)
+        line = self.process.stdout.readline()
+        if not line.startswith("listening on "):
+            self.process.kill()
+            raise RuntimeError(f"the lock server didn't start: {line}")
+        self.url = line.split(" ")[-1].strip()
+
+    def __call(self, path: str, data: dict = None) -> dict:
+        body = None if data is None else json.dumps(data).encode("utf-8")
+        with urllib.request.urlopen(urllib.request.Request(self.url + path, body)) as response:
+            return json.loads(response.read())
+
+    def reset(self, ours: list[str], theirs: list[str]) -> None:
+        self.__call("/_reset", {"ours": ours, "theirs": theirs})
+
+    def requests(self) -> int:
+        return self.__call("/_stats")["total"]
+
+    def stop(self) -> None:
+        self.process.kill()
+        self.process.wait()
+
+
+class Repo:
+    """A throwaway repo with lockable .blend files, a local origin and the lock server as LFS endpoint"""
+
+    def __init__(self, folder: str, server: LockServer, args):
+        self.root = os.path.join(folder, "work")
+        origin = os.path.join(folder, "origin.git")
+        git(["init", "-q", "--bare", origin], folder)
+        git(["init", "-q", self.root], folder)
+        for key, value in (("user.name", "bench"), ("user.email", "bench@localhost"),
+                           ("lfs.url", server.url), ("lfs.locksverify", "true")):
+            git(["config", key, value], self.root)
+        with open(os.path.join(self.root, ".gitattributes"), "w", encoding="utf-8") as file:
+            file.write("*.blend lockable\n")
+
+        self.files = [f"assets/group_{i // 100:03}/file_{i:05}.blend" for i in range(args.files)]
+        for path in self.files:
+            full_path = self.absolute(path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, "wb") as file:
+                file.write(b"BLENDER-v403" + path.encode())
+        git(["add", "-A"], self.root)
+        git(["commit", "-q", "-m", "assets"], self.root)
+        git(["remote", "add", "origin", origin], self.root)
+        git(["push", "-q", "-u", "origin", "HEAD"], self.root)
+
+        self.current = self.absolute(self.files[0])
+        """The file open in Blender, nobody holds its lock at the start"""
+        self.ours = self.files[1:1 + args.ours]
+        """Committed files we hold the lock of, unlock all frees them"""
+        theirs_in_repo = self.files[1 + args.ours:1 + args.ours + args.theirs]
+        self.theirs = theirs_in_repo + [f"elsewhere/file_{i:05}.blend"
+                                        for i in range(args.theirs - len(theirs_in_repo))]
+        self.libraries = [self.absolute(i) for i in (self.ours + theirs_in_repo)[:args.libraries]]
+
+    def absolute(self, path: str) -> str:
+        return os.path.normpath(os.path.join(self.root, path))
+
+    def reset_locks(self, server: LockServer) -> None:
+        """Back to the locks at the start, with the file permissions LFS would have set"""
+        server.reset(self.ours, self.theirs)
+        theirs = set(self.theirs)
+        for path in self.files:
+            os.chmod(self.absolute(path), 0o444 if path in theirs or path == self.files[0] else 0o644)
+
+
+class Measurement:
+    """Wall time, time the main thread was busy, git processes and server requests of one operation"""
+
+    def __init__(self, addon, server: LockServer):
+        self.addon = addon
+        self.server = server
+        self.samples: list[dict] = []
+
+    def __enter__(self) -> "Measurement":
+        self.calls = self.addon.subprocess.calls
+        self.requests = self.server.requests()
+        self.main_thread = 0.0
+        self.start = time.perf_counter()
+        return self
+
+    def main(self, function, *args):
+        """Runs function on the "main thread", its time counts as blocking the UI"""
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.main_thread += time.perf_counter() - start
+
+    def __exit__(self, *_exc) -> None:
+        wall = time.perf_counter() - self.start
+        self.samples.append({
+            "wall": wall,
+            "main_thread": self.main_thread,
+            "processes": self.addon.subprocess.calls - self.calls,
+            "requests": self.server.requests() - self.requests,
+        })
+
+
+def summarize(loader, samples: list[dict], failed: int = 0) -> dict:
+    result = {key: bench_loader.summarize(loader, [i[key] for i in samples]) for key in ("wall", "main_thread")}
+    result["processes"] = max(i["processes"] for i in samples)
+    result["requests"] = max(i["requests"] for i in samples)
+    result["failed"] = failed
+    return result
+
+
+def forget_repos(addon) -> None:
+    """Drops the cached repo state, like a fresh Blender session"""
+    addon.close_repos()
+    addon.REPOS.clear()
+    addon.REPO_FOLDERS.clear()
+
+
+def wait_for_jobs(addon, bpy, measurement: Measurement, done) -> None:
+    """Calls the job timer like Blender would until done() is true"""
+    while not done():
+        measurement.main(bpy.app.timers.run_once)
+        time.sleep(addon.JOB_POLL_SEC)
+    measurement.main(bpy.app.timers.run_once)
+
+
+def run_operator(addon, bpy, measurement: Measurement, operator_class) -> bool:
+    """Invokes the operator and sends it timer events until it's done, true if it finished"""
+    context = bpy.context
+    operator = operator_class()
+    result = measurement.main(operator.invoke, context, None)
+    event = types.SimpleNamespace(type='TIMER')
+    while result == {'RUNNING_MODAL'}:
+        time.sleep(addon.JOB_POLL_SEC)
+        result = measurement.main(operator.modal, context, event)
+    return result == {'FINISHED'}
+
+
+def bench(loader, bpy, addon, server: LockServer, repo: Repo, args) -> dict:
+    bpy.data.filepath = repo.current
+    bpy.data.libraries = [types.SimpleNamespace(filepath=i) for i in repo.libraries]
+    results = {}
+
+    def measure(name: str, operation, fresh: bool = False) -> None:
+        measurement = Measurement(addon, server)
+        failed = 0
+        for _ in range(args.repeat):
+            repo.reset_locks(server)
+            if fresh:
+                forget_repos(addon)
+            with measurement:
+                try:
+                    failed += not operation(measurement)
+                except Exception as ex: # injected server errors surface here
+                    print(f"{name} failed: {ex}")
+                    failed += 1
+        results[name] = summarize(loader, measurement.samples, failed)
+
+    def update_lock_status(measurement: Measurement) -> bool:
+        measurement.main(addon.update_lock_status, repo.current)
+        return addon.CURRENT_STATE == addon.LockStatus.NO_LOCK
+
+    measure("update_lock_status_cold", update_lock_status, fresh=True)
+    measure("update_lock_status_warm", update_lock_status)
+
+    def request_lock_status(measurement: Measurement) -> bool:
+        measurement.main(addon.request_lock_status, repo.current, True)
+        future = addon.STATUS_JOB[1]
+        wait_for_jobs(addon, bpy, measurement, future.done)
+        return addon.CURRENT_STATE == addon.LockStatus.NO_LOCK
+    measure("request_lock_status", request_lock_status)
+
+    measure("get_locks_to_free", lambda measurement: len(
+        measurement.main(addon.get_locks_to_free, repo.current)) == len(repo.ours))
+
+    def lock_and_unlock(measurement: Measurement) -> bool:
+        os.chmod(repo.current, 0o644) # what git lfs lock does on its own
+        return (run_operator(addon, bpy, measurement, addon.SB_LockLfsFile)
+                and run_operator(addon, bpy, measurement, addon.SB_UnlockLfsFile))
+    measure("lock_unlock_operators", lock_and_unlock)
+
+    measure("unlock_all_operator", lambda measurement: run_operator(
+        addon, bpy, measurement, addon.SB_UnlockAllLfsFiles))
+    return results
+
+
+def versions() -> dict:
+    result = {}
+    for name, args in (("git", ["git", "--version"]), ("git_lfs", ["git", "lfs", "version"])):
+        try:
+            result[name] = subprocess.check_output(args, stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            result[name] = None
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--addon", default=DEFAULT_ADDON, help="lfs_file_locking.py to benchmark")
+    parser.add_argument("--loader", default=bench_loader.DEFAULT_LOADER, help="stuntboost_bpl.py the add-on imports")
+    parser.add_argument("--files", type=int, default=500, help="committed .blend files in the repo")
+    parser.add_argument("--ours", type=int, default=50, help="locks we hold, unlock all frees them")
+    parser.add_argument("--theirs", type=int, default=1000, help="locks of other users, not all are in the repo")
+    parser.add_argument("--libraries", type=int, default=20, help="linked libraries of the open file")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds each server request takes")
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0, help="share of server requests failing")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON result, exits with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slow down for --compare")
+    parser.add_argument("--verbose", action="store_true", help="show the add-on's output")
+    args = parser.parse_args()
+
+    tool_versions = versions()
+    if tool_versions["git_lfs"] is None:
+        print("git lfs is not installed", file=sys.stderr)
+        return 2
+    # never ask for credentials, the stand-in doesn't want any
+    os.environ["GIT_TERMINAL_PROMPT"] = "0"
+
+    bpy, loader = bench_loader.load_loader(os.path.abspath(args.loader))
+    addon = load_addon(os.path.abspath(args.addon))
+    server = LockServer(args)
+    temp = tempfile.mkdtemp(prefix="lfs_bench_")
+    try:
+        repo = Repo(temp, server, args)
+        output = sys.stdout if args.verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results = bench(loader, bpy, addon, server, repo, args)
+    finally:
+        addon.JOBS.shutdown()
+        forget_repos(addon)
+        server.stop()
+        shutil.rmtree(temp, ignore_errors=True)
+
+    result = {
+        "schema": SCHEMA_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "addon": bench_loader.loader_info(os.path.abspath(args.addon)),
+        "tools": tool_versions,
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("addon", "loader", "output", "compare", "verbose")},
+        "results": results,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            return 1 if bench_loader.compare(json.load(file), result, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
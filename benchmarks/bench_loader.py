@@ -0,0 +1,395 @@
+"""
+Headless benchmark of the BPL ModuleManager against a generated bpl_auto_load tree.
+Runs without Blender, bpy is replaced by bpy_stub. Results are written as JSON,
+pass a previous result with --compare to see what got slower.
+
+    python benchmarks/bench_loader.py --modules 2000 --output result.json
+    python benchmarks/bench_loader.py --compare result.json
+"""
+
+import sys
+import os
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+import bpy_stub
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOADER = os.path.join(REPO_ROOT, "blender_addons", "loader_addon", "stuntboost_bpl.py")
+SCHEMA_VERSION = 1
+
+
+def load_loader(path: str):
+    """Imports the loader add-on against a fresh bpy stub"""
+    bpy = bpy_stub.install()
+    spec = importlib.util.spec_from_file_location("stuntboost_bpl", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module # like Blender does for add-ons, sub-plugins import it
+    spec.loader.exec_module(module)
+    return bpy, module
+
+
+class SyntheticTree:
+    """A generated auto load folder. Modules are spread over nested groups, some groups are
+    .bplignore'd and most modules import one of the helper modules."""
+
+    def __init__(self, folder: str, modules: int, helpers: int, seed: int):
+        self.folder = folder
+        self.random = random.Random(seed)
+        self.helpers: list[str] = []
+        self.modules: list[str] = []
+        self.ignored: list[str] = []
+        """Files below a .bplignore, these must never be loaded"""
+        self.groups: list[str] = []
+        self.edits = 0
+        self.next_index = 0
+
+        group_count = max(1, modules // 50)
+        for i in range(group_count):
+            group = os.path.join(folder, f"group_{i:03}", f"sub_{i % 4}")
+            os.makedirs(group)
+            self.groups.append(group)
+        for i in range(max(1, group_count // 10)):
+            ignored = os.path.join(folder, f"group_{i:03}", "wip", "nested")
+            os.makedirs(ignored)
+            with open(os.path.join(folder, f"group_{i:03}", "wip", ".bplignore"), "w", encoding="utf-8"):
+                pass
+            for j in range(5):
+                self.ignored.append(self.__write_module(os.path.join(ignored, f"wip_{i:03}_{j}.py")))
+        helper_folder = os.path.join(folder, "helpers")
+        os.makedirs(helper_folder)
+        for i in range(helpers):
+            path = os.path.join(helper_folder, f"helper_{i:03}.py")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(self.__helper_source(i))
+            self.helpers.append(path)
+        for _ in range(modules):
+            self.add_module()
+
+    def __helper_source(self, index: int) -> str:
+        lines = [f'"""Shared code {index}"""', "", f"VALUE = {index}", ""]
+        for i in range(10):
+            lines += [f"def util_{i}(value):", f"    return value * {i} + VALUE", ""]
+        return "\n".join(lines)
+
+    def __module_source(self, index: int) -> str:
+        lines = ['"""Generated sub-plugin"""', "import bpy"]
+        helper = None
+        if self.helpers and index % 5 != 0:
+            helper = os.path.splitext(os.path.basename(self.helpers[index % len(self.helpers)]))[0]
+            lines.append(f"import {helper}")
+        lines += ["", "", f"class Module{index}Loader:", "    @staticmethod", "    def bpl_load():",
+                  f"        return {helper}.util_1({index})" if helper else "        pass",
+                  "", "    @staticmethod", "    def bpl_unload():", "        pass", ""]
+        if index % 3 == 0:
+            lines += ["", f"class BENCH_OT_module_{index}(bpy.types.Operator):",
+                      f'    """Operator of module {index}"""',
+                      f'    bl_idname = "bench.module_{index}"',
+                      f'    bl_label = "Module {index}"',
+                      "    bpl_auto_load = True", "",
+                      "    def execute(self, _context):", "        return {'FINISHED'}", ""]
+        for i in range(8):
+            lines += [f"def function_{i}(values):", f"    return [value + {i} for value in values if value % 2]", ""]
+        return "\n".join(lines)
+
+    def __write_module(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.__module_source(self.next_index))
+        self.next_index += 1
+        return path
+
+    def add_module(self) -> str:
+        group = self.groups[self.next_index % len(self.groups)]
+        path = self.__write_module(os.path.join(group, f"module_{self.next_index:05}.py"))
+        self.modules.append(path)
+        return path
+
+    def remove_module(self, path: str) -> None:
+        os.remove(path)
+        self.modules.remove(path)
+
+    def edit(self, path: str) -> None:
+        """Changes the content, not only the modification time"""
+        self.edits += 1
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(f"\n# edit {self.edits}\n")
+
+    def leaf_module(self) -> str:
+        """A module no other module imports"""
+        return self.random.choice(self.modules)
+
+    def pull(self, modified_fraction: float, added: int, removed: int) -> tuple[list[str], list[str]]:
+        """Simulates a git pull, returns the files which have to be (re)loaded and the removed ones"""
+        modified = self.random.sample(self.modules, int(len(self.modules) * modified_fraction))
+        modified += self.random.sample(self.helpers, min(2, len(self.helpers)))
+        gone = self.random.sample([i for i in self.modules if i not in modified], removed)
+        for path in modified:
+            self.edit(path)
+        for path in gone:
+            self.remove_module(path)
+        return modified + [self.add_module() for _ in range(added)], gone
+
+
+class Run:
+    """One started ModuleManager on the tree, driven by hand instead of Blender's timers"""
+
+    def __init__(self, loader, bpy, tree: SyntheticTree, args, code_cache_folder: str = None, lazy_load: bool = False):
+        self.loader = loader
+        self.bpy = bpy
+        self.manager = loader.ModuleManager(tree.folder, args.interval)
+        self.manager.settle_seconds = args.settle
+        self.manager.lazy_load = lazy_load
+        if code_cache_folder is not None:
+            self.manager.code_cache = loader.CodeCache(code_cache_folder)
+        self.timeout = args.timeout
+        start = time.perf_counter()
+        self.manager.start_watching()
+        self.startup_seconds = time.perf_counter() - start
+        self.tick = next(i for i in bpy.app.timers.registered if getattr(i, "__self__", None) is self.manager)
+
+    def loads(self, full_path: str) -> int:
+        timings = self.manager.profiler.modules.get(full_path)
+        return 0 if timings is None else timings.loads
+
+    def wait_detected(self, start: float) -> float:
+        """Seconds from start, taken before the first write, until the watcher thread reported a change.
+        The watcher usually reports before the writing returns, so the clock can't start after it."""
+        while self.manager.watcher.changes.empty():
+            if time.perf_counter() - start > self.timeout:
+                raise TimeoutError("the watcher didn't report the change")
+            time.sleep(0.0005)
+        return time.perf_counter() - start
+
+    def run_until(self, done) -> tuple[float, float, int]:
+        """Calls the check like Blender's timer would, honoring the returned intervals.
+        Returns the wall time, the time spent in the check and the number of checks."""
+        start = time.perf_counter()
+        busy = 0.0
+        ticks = 0
+        while True:
+            tick_start = time.perf_counter()
+            interval = self.tick()
+            busy += time.perf_counter() - tick_start
+            ticks += 1
+            if done():
+                return time.perf_counter() - start, busy, ticks
+            if time.perf_counter() - start > self.timeout:
+                raise TimeoutError("the changes weren't applied in time")
+            time.sleep(interval)
+
+    def measure_change(self, start: float, loaded: list[str], removed: list[str]) -> dict:
+        """start is time.perf_counter() from before the files were written"""
+        before = {i: self.loads(i) for i in loaded}
+        detect_seconds = self.wait_detected(start)
+        def done() -> bool:
+            return (all(self.loads(i) > before[i] for i in loaded)
+                    and not any(i in self.manager.files for i in removed))
+        apply_seconds, busy_seconds, ticks = self.run_until(done)
+        return {"detect": detect_seconds, "apply": apply_seconds, "main_thread": busy_seconds, "ticks": ticks}
+
+    def stop(self) -> None:
+        self.manager.stop_watching()
+        self.manager.unload_all()
+
+
+def summarize(loader, samples: list[float]) -> dict:
+    timings = loader.RollingTimings(len(samples))
+    for i in samples:
+        timings.add(i)
+    result = timings.to_dict()
+    result["min_ms"] = min(samples, default=0.0) * 1000
+    return result
+
+
+def summarize_changes(loader, samples: list[dict]) -> dict:
+    result = {key: summarize(loader, [i[key] for i in samples]) for key in ("detect", "apply", "main_thread")}
+    result["ticks"] = max(i["ticks"] for i in samples)
+    return result
+
+
+def bench_cold_start(loader, bpy, tree: SyntheticTree, args, temp: str) -> dict:
+    results = {}
+    variants = {
+        "no_cache": lambda repeat: None,
+        "cold_cache": lambda repeat: os.path.join(temp, f"cold_cache_{repeat}"),
+        "warm_cache": lambda repeat: os.path.join(temp, "warm_cache"),
+    }
+    Run(loader, bpy, tree, args, os.path.join(temp, "warm_cache")).stop()
+    for name, cache_folder in variants.items():
+        samples = []
+        for repeat in range(args.repeat):
+            run = Run(loader, bpy, tree, args, cache_folder(repeat))
+            loaded = len(run.manager.files)
+            if loaded != len(tree.modules) + len(tree.helpers):
+                raise RuntimeError(f"expected {len(tree.modules) + len(tree.helpers)} files, loaded {loaded}")
+            run.stop()
+            samples.append(run.startup_seconds)
+        results[name] = summarize(loader, samples)
+    samples = []
+    for _ in range(args.repeat):
+        run = Run(loader, bpy, tree, args, os.path.join(temp, "warm_cache"), lazy_load=True)
+        run.stop()
+        samples.append(run.startup_seconds)
+    results["lazy_warm_cache"] = summarize(loader, samples)
+    return results
+
+
+def bench_running(loader, bpy, tree: SyntheticTree, args, temp: str) -> dict:
+    results = {}
+    run = Run(loader, bpy, tree, args, os.path.join(temp, "warm_cache"))
+    try:
+        samples = []
+        for _ in range(args.idle_ticks):
+            start = time.perf_counter()
+            run.tick()
+            samples.append(time.perf_counter() - start)
+        results["idle_tick"] = summarize(loader, samples)
+        results["idle_tick"]["watcher"] = type(run.manager.watcher.backend).__name__
+        results["idle_tick"]["watcher_stat_calls"] = run.manager.watcher.stat_calls
+
+        scanner = loader.DirectoryScanner(tree.folder)
+        scanner.scan()
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            scanner.scan()
+            samples.append(time.perf_counter() - start)
+        results["poll_scan"] = summarize(loader, samples)
+        results["poll_scan"]["stat_calls"] = scanner.stat_calls
+
+        samples = []
+        for _ in range(args.repeat):
+            path = tree.leaf_module()
+            start = time.perf_counter()
+            tree.edit(path)
+            samples.append(run.measure_change(start, [path], []))
+        results["single_file_reload"] = summarize_changes(loader, samples)
+
+        samples = []
+        for i in range(args.repeat):
+            path = tree.helpers[i % len(tree.helpers)]
+            start = time.perf_counter()
+            tree.edit(path)
+            samples.append(run.measure_change(start, [path], []))
+        results["helper_reload"] = summarize_changes(loader, samples)
+
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            loaded, removed = tree.pull(args.pull_fraction, args.pull_added, args.pull_removed)
+            samples.append(run.measure_change(start, loaded, removed))
+        results["mass_change_reload"] = summarize_changes(loader, samples)
+        results["mass_change_reload"]["files"] = (
+            int(len(tree.modules) * args.pull_fraction) + args.pull_added + args.pull_removed)
+    finally:
+        run.stop()
+    return results
+
+
+def loader_info(path: str) -> dict:
+    with open(path, "rb") as file:
+        content_hash = hashlib.blake2b(file.read(), digest_size=16).hexdigest()
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(path), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"path": path, "hash": content_hash, "commit": commit}
+
+
+def flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    """Scenario/metric name to the median, the value regressions are judged by"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            if "p50_ms" in value:
+                flat[prefix + key] = value["p50_ms"]
+            else:
+                flat.update(flatten(value, f"{prefix}{key}."))
+    return flat
+
+
+def compare(old: dict, new: dict, threshold: float) -> bool:
+    """Prints the changes of the medians, true if anything got slower by more than threshold"""
+    old_flat = flatten(old["results"])
+    regressed = False
+    for name, value in flatten(new["results"]).items():
+        if name not in old_flat:
+            continue
+        before = old_flat[name]
+        ratio = value / before if before else 1.0
+        # sub millisecond timings are mostly noise
+        slower = ratio > 1 + threshold and value - before > 1.0
+        regressed |= slower
+        marker = "REGRESSION" if slower else ""
+        print(f"{name:45} {before:10.2f} ms -> {value:10.2f} ms  x{ratio:5.2f} {marker}")
+    return regressed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loader", default=DEFAULT_LOADER, help="stuntboost_bpl.py to benchmark")
+    parser.add_argument("--modules", type=int, default=2000)
+    parser.add_argument("--helpers", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--idle-ticks", type=int, default=1000)
+    parser.add_argument("--interval", type=float, default=1, help="check interval, the same as in Blender")
+    parser.add_argument("--settle", type=float, default=0,
+                        help="hot reload delay, 0 so the reload timings are the loader's own work")
+    parser.add_argument("--pull-fraction", type=float, default=0.1, help="share of modules a pull modifies")
+    parser.add_argument("--pull-added", type=int, default=20)
+    parser.add_argument("--pull-removed", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--compare", help="previous JSON result, exits with 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slow down for --compare")
+    parser.add_argument("--verbose", action="store_true", help="show the loader's output")
+    args = parser.parse_args()
+
+    bpy, loader = load_loader(os.path.abspath(args.loader))
+    temp = tempfile.mkdtemp(prefix="bpl_bench_")
+    try:
+        tree = SyntheticTree(os.path.join(temp, "bpl_auto_load"), args.modules, args.helpers, args.seed)
+        output = sys.stdout if args.verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            results = {"cold_start": bench_cold_start(loader, bpy, tree, args, temp)}
+            results.update(bench_running(loader, bpy, tree, args, temp))
+    finally:
+        shutil.rmtree(temp, ignore_errors=True)
+
+    result = {
+        "schema": SCHEMA_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "loader": loader_info(os.path.abspath(args.loader)),
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("loader", "output", "compare", "verbose")},
+        "results": results,
+    }
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text)
+    elif not args.compare:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            return 1 if compare(json.load(file), result, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""
+Minimal stand-in for Blender's bpy module, so the add-ons can be imported and
+timed by plain python without a Blender build.
+Only what the add-ons in this repo touch is implemented, everything else is a no-op.
+"""
+
+import sys
+import types
+
+
+class Timers:
+    """bpy.app.timers, nothing runs on its own, call run_once() like Blender would."""
+
+    def __init__(self):
+        self.registered: dict[object, float] = {}
+        """Callback to the interval it was registered with"""
+
+    def register(self, function, first_interval=0, persistent=False):
+        self.registered[function] = first_interval
+
+    def unregister(self, function):
+        if function not in self.registered:
+            raise ValueError(f"Error: function is not registered: {function}")
+        del self.registered[function]
+
+    def is_registered(self, function) -> bool:
+        return function in self.registered
+
+    def run_once(self) -> None:
+        """Runs every registered timer once, like Blender would after their interval"""
+        for function in list(self.registered):
+            interval = function()
+            if interval is None:
+                self.registered.pop(function, None)
+            else:
+                self.registered[function] = interval
+
+
+class Registry:
+    """Tracks registered classes, registering twice fails like it does in Blender"""
+
+    def __init__(self):
+        self.classes: set[type] = set()
+
+    def register_class(self, cls: type) -> None:
+        if cls in self.classes:
+            raise ValueError(f"register_class(...): already registered as a subclass '{cls.__name__}'")
+        self.classes.add(cls)
+
+    def unregister_class(self, cls: type) -> None:
+        if cls not in self.classes:
+            raise RuntimeError(f"unregister_class(...): missing bl_rna attribute from '{cls.__name__}'")
+        self.classes.remove(cls)
+
+
+class Layout:
+    def __getattr__(self, _name: str):
+        return lambda *args, **kwargs: self
+
+
+class StructBase:
+    layout = Layout()
+
+    def report(self, _type: set[str], message: str) -> None:
+        print(message)
+
+    # extra draw functions of menus and headers, like TOPBAR_MT_editor_menus.append(draw)
+    @classmethod
+    def append(cls, function) -> None:
+        cls.draw_functions = getattr(cls, "draw_functions", []) + [function]
+
+    @classmethod
+    def prepend(cls, function) -> None:
+        cls.draw_functions = [function] + getattr(cls, "draw_functions", [])
+
+    @classmethod
+    def remove(cls, function) -> None:
+        cls.draw_functions = [i for i in getattr(cls, "draw_functions", []) if i is not function]
+
+
+class WindowManager:
+    """bpy.context.window_manager, without windows and with modal handlers that never get events"""
+
+    def __init__(self):
+        self.windows: list = []
+        self.modal_handlers: list = []
+
+    def event_timer_add(self, time_step: float, window=None):
+        return types.SimpleNamespace(time_step=time_step, window=window)
+
+    def event_timer_remove(self, _timer) -> None:
+        pass
+
+    def modal_handler_add(self, operator) -> bool:
+        self.modal_handlers.append(operator)
+        return True
+
+    def popup_menu(self, _draw, title: str = "", icon: str = 'NONE') -> None:
+        pass
+
+
+class WorkSpace:
+    def __init__(self):
+        self.status_text: str = None
+
+    def status_text_set(self, text: str) -> None:
+        self.status_text = text
+
+
+def property_stub(kind: str):
+    def make(**kwargs):
+        return (kind, kwargs)
+    make.__name__ = kind
+    return make
+
+
+def persistent(function):
+    return function
+
+
+def make_types_module() -> types.ModuleType:
+    module = types.ModuleType("bpy.types")
+    for name in ("Operator", "Menu", "Panel", "AddonPreferences", "PropertyGroup", "UIList", "Header"):
+        setattr(module, name, type(name, (StructBase,), {}))
+    def get_type(name: str) -> type:
+        if name.startswith("__"):
+            raise AttributeError(name)
+        cls = type(name, (StructBase,), {})
+        setattr(module, name, cls)
+        return cls
+    module.__getattr__ = get_type
+    return module
+
+
+def install(version: tuple[int, int, int] = (4, 3, 0), background: bool = False) -> types.ModuleType:
+    """Puts a fresh bpy into sys.modules and returns it, call before importing an add-on"""
+    bpy = types.ModuleType("bpy")
+    bpy.types = make_types_module()
+
+    bpy.app = types.ModuleType("bpy.app")
+    bpy.app.version = version
+    bpy.app.background = background
+    bpy.app.timers = Timers()
+    bpy.app.is_job_running = lambda job_type: False
+    bpy.app.handlers = types.ModuleType("bpy.app.handlers")
+    bpy.app.handlers.persistent = persistent
+    bpy.app.handlers.load_post = []
+    bpy.app.handlers.save_post = []
+    bpy.app.handlers.depsgraph_update_post = []
+
+    registry = Registry()
+    bpy.utils = types.SimpleNamespace(
+        register_class=registry.register_class,
+        unregister_class=registry.unregister_class,
+        registry=registry,
+    )
+    bpy.props = types.SimpleNamespace(**{name: property_stub(name) for name in (
+        "StringProperty", "BoolProperty", "IntProperty", "FloatProperty",
+        "EnumProperty", "PointerProperty", "CollectionProperty")})
+    bpy.path = types.SimpleNamespace(abspath=lambda path: path)
+    bpy.ops = types.SimpleNamespace()
+    bpy.data = types.SimpleNamespace(filepath="", libraries=[])
+    bpy.context = types.SimpleNamespace(
+        preferences=types.SimpleNamespace(addons={}),
+        window_manager=WindowManager(),
+        workspace=WorkSpace(),
+        window=None,
+    )
+
+    sys.modules["bpy"] = bpy
+    sys.modules["bpy.types"] = bpy.types
+    sys.modules["bpy.app"] = bpy.app
+    sys.modules["bpy.app.handlers"] = bpy.app.handlers
+    return bpy
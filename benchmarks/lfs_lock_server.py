@@ -0,0 +1,224 @@
+"""
+Stand-in for the locking API of a git LFS server, so lfs_file_locking.py can be tried
+without our LFS host. Locks only live in memory, nothing else of LFS is implemented.
+Point a repo at it with `git config lfs.url http://127.0.0.1:<port>`.
+
+    python benchmarks/lfs_lock_server.py --port 8080 --latency 0.2 --error-rate 0.05
+
+Everyone talking to it is the same user, locks of other users are added with --theirs
+or POST /_reset {"ours": [paths], "theirs": [paths]}. GET /_stats returns the request counts.
+"""
+
+import sys
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "application/vnd.git-lfs+json"
+DEFAULT_LIMIT = 100
+
+
+class LockServerState:
+    """Locks and the knobs to make the server slow or flaky"""
+
+    def __init__(self, user: str, latency: float, jitter: float, error_rate: float, seed: int):
+        self.user = user
+        self.latency = latency
+        self.jitter = jitter
+        """Up to this many seconds are randomly added to the latency"""
+        self.error_rate = error_rate
+        """Share of requests which fail with a 500"""
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.locks: dict[str, dict] = {}
+        """Lock id to the lock as sent to clients, in the order they were created"""
+        self.next_id = 1
+        self.requests: dict[str, int] = {}
+        """Endpoint to how often it was called"""
+        self.errors = 0
+
+    def reset(self, ours: list[str], theirs: list[str]) -> None:
+        with self.lock:
+            self.locks = {}
+            self.requests = {}
+            self.errors = 0
+            for path in ours:
+                self.__add(path, self.user)
+            for path in theirs:
+                self.__add(path, "someone else")
+
+    def __add(self, path: str, owner: str) -> dict:
+        lock = {
+            "id": str(self.next_id),
+            "path": path,
+            "locked_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "owner": {"name": owner},
+        }
+        self.next_id += 1
+        self.locks[lock["id"]] = lock
+        return lock
+
+    def find(self, path: str) -> dict:
+        for lock in self.locks.values():
+            if lock["path"] == path:
+                return lock
+        return None
+
+    def create(self, path: str) -> tuple[int, dict]:
+        with self.lock:
+            existing = self.find(path)
+            if existing is not None:
+                return 409, {"lock": existing, "message": "already created lock"}
+            return 201, {"lock": self.__add(path, self.user)}
+
+    def unlock(self, lock_id: str, force: bool) -> tuple[int, dict]:
+        with self.lock:
+            lock = self.locks.get(lock_id)
+            if lock is None:
+                return 404, {"message": "lock not found"}
+            if lock["owner"]["name"] != self.user and not force:
+                return 403, {"message": f"lock is owned by {lock['owner']['name']}"}
+            del self.locks[lock_id]
+            return 200, {"lock": lock}
+
+    def page(self, locks: list[dict], cursor: str, limit: int) -> tuple[list[dict], str]:
+        start = int(cursor) if cursor else 0
+        end = start + (limit or DEFAULT_LIMIT)
+        return locks[start:end], str(end) if end < len(locks) else ""
+
+    def list(self, path: str, lock_id: str, cursor: str, limit: int) -> dict:
+        with self.lock:
+            locks = [i for i in self.locks.values()
+                     if (not path or i["path"] == path) and (not lock_id or i["id"] == lock_id)]
+        locks, next_cursor = self.page(locks, cursor, limit)
+        return {"locks": locks, "next_cursor": next_cursor}
+
+    def verify(self, cursor: str, limit: int) -> dict:
+        with self.lock:
+            locks = list(self.locks.values())
+        locks, next_cursor = self.page(locks, cursor, limit)
+        return {
+            "ours": [i for i in locks if i["owner"]["name"] == self.user],
+            "theirs": [i for i in locks if i["owner"]["name"] != self.user],
+            "next_cursor": next_cursor,
+        }
+
+    def count(self, endpoint: str) -> bool:
+        """Counts the request and waits like a slow server would, false if it should fail"""
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+        time.sleep(delay)
+        return not failed
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"requests": dict(self.requests), "total": sum(self.requests.values()),
+                    "errors": self.errors, "locks": len(self.locks)}
+
+
+class LockRequestHandler(BaseHTTPRequestHandler):
+    state: LockServerState = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None: # pylint: disable=redefined-builtin
+        pass
+
+    def send_json(self, status: int, data: dict, content_type: str = CONTENT_TYPE) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def do_GET(self) -> None: # pylint: disable=invalid-name
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if url.path == "/_stats":
+            self.send_json(200, self.state.stats(), "application/json")
+        elif url.path.endswith("/locks"):
+            if not self.state.count("list"):
+                self.send_json(500, {"message": "injected failure"})
+                return
+            self.send_json(200, self.state.list(
+                query.get("path"), query.get("id"), query.get("cursor"), int(query.get("limit") or 0)))
+        else:
+            self.send_json(404, {"message": f"not found: {url.path}"})
+
+    def do_POST(self) -> None: # pylint: disable=invalid-name
+        url = urllib.parse.urlsplit(self.path)
+        body = self.read_json()
+        if url.path == "/_reset":
+            self.state.reset(body.get("ours", []), body.get("theirs", []))
+            self.send_json(200, self.state.stats(), "application/json")
+            return
+
+        parts = url.path.rstrip("/").split("/")
+        if parts[-1] == "locks":
+            endpoint = "create"
+        elif parts[-2:] == ["locks", "verify"]:
+            endpoint = "verify"
+        elif len(parts) >= 3 and parts[-3] == "locks" and parts[-1] == "unlock":
+            endpoint = "unlock"
+        else:
+            self.send_json(404, {"message": f"not found: {url.path}"})
+            return
+        if not self.state.count(endpoint):
+            self.send_json(500, {"message": "injected failure"})
+            return
+
+        if endpoint == "create":
+            self.send_json(*self.state.create(body["path"]))
+        elif endpoint == "verify":
+            self.send_json(200, self.state.verify(body.get("cursor"), body.get("limit") or 0))
+        else:
+            self.send_json(*self.state.unlock(parts[-2], bool(body.get("force"))))
+
+
+def make_server(state: LockServerState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    handler = type("BoundLockRequestHandler", (LockRequestHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="0 picks a free one, it's printed on start")
+    parser.add_argument("--user", default="bench", help="owner of the locks clients create")
+    parser.add_argument("--latency", type=float, default=0, help="seconds every request takes")
+    parser.add_argument("--jitter", type=float, default=0, help="random extra seconds per request")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests failing with a 500")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--theirs", type=int, default=0, help="locks of other users to start with")
+    args = parser.parse_args()
+
+    state = LockServerState(args.user, args.latency, args.jitter, args.error_rate, args.seed)
+    state.reset([], [f"other/file_{i:05}.blend" for i in range(args.theirs)])
+    server = make_server(state, args.host, args.port)
+    # the benchmark reads the url from this line
+    print(f"listening on http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
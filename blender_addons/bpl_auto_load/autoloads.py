@@ -1,3 +1,3 @@
-# this should be a __init__.py file so blender can load the modules from the sys.paths set in the loader
+# this should be a __init__.py file so blender can import the modules through the loader's import hook
 # however, a __init__.py messes with the auto complete of vscode.
 # When this file exists blender loads properly and vscode is happy as well
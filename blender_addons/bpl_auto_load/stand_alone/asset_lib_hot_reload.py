@@ -1,21 +1,95 @@
 """
-This addon periodically checks for any changes in the .blend files referenced as
-libraries in the current file to automatically reload them.
+This addon watches the .blend files referenced as libraries in the current file
+to automatically reload them when they change.
 """
 
-
 import os
+import time
+import concurrent.futures
 
 # pylint: disable=import-error
 import bpy
 from bpy.app.handlers import persistent
+import stuntboost_bpl
+import blend_diff
 # pylint: enable=import-error
 
-CHECK_INTERVAL_SEC = 5
+SETTLE_SEC = 2.0
+"""A changed library has to stay untouched this long before it's reloaded, so a pull or a save
+in another Blender is done writing it. Longer than the BPL watch interval."""
+MISSING_TIMEOUT_SEC = 60
+"""How long a library may be gone, git replaces files by deleting and recreating them"""
+IDLE_RETRY_SEC = 0.5
+"""How often to look whether Blender got idle while reloads are waiting"""
+SHOW_PENDING_INDICATOR = True
+"""Shows waiting reloads in the status bar, clicking it reloads them right away"""
+BUSY_JOBS = ('RENDER', 'OBJECT_BAKE', 'COMPOSITE')
+SKIP_UNCHANGED_LINKS = True
+"""Compares what the current file links from a changed library with the version that is loaded,
+reloads are skipped when none of it changed. The files are read in a background thread."""
+
+SB_RELOAD_PENDING_OPERATOR = "wm.sb_reload_pending_libraries"
+
+
+def is_idle() -> bool:
+    """No playback, modal tool, render or bake running, a reload now doesn't get in anyone's way"""
+    for job in BUSY_JOBS:
+        if bpy.app.is_job_running(job):
+            return False
+    for window in bpy.context.window_manager.windows:
+        if window.screen is not None and window.screen.is_animation_playing:
+            return False
+        # Window.modal_operators exists since Blender 4.2
+        if len(getattr(window, "modal_operators", ())) != 0:
+            return False
+    return True
+
+
+def redraw_status_bar() -> None:
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'STATUSBAR':
+                area.tag_redraw()
+
+
+def library_path(lib: bpy.types.Library) -> str:
+    """Normalized like the paths of the BPL watch service"""
+    return os.path.normcase(os.path.abspath(bpy.path.abspath(lib.filepath)))
+
+
+def linked_names(lib: bpy.types.Library) -> set[str]:
+    """Names of the IDs the current file uses from the library, None if Blender doesn't tell"""
+    users = getattr(lib, "users_id", None)
+    if users is None:
+        return None
+    return {i.name for i in users}
+
+
+def library_depth(lib: bpy.types.Library) -> int:
+    """0 for directly linked libraries, the number of libraries in between for indirectly linked ones"""
+    depth = 0
+    while lib.parent is not None:
+        lib = lib.parent
+        depth += 1
+    return depth
+
 
 class AssetLibReloader():
-    files: dict[str, float] = {}
-    """Holds the absolute file path and a timestamp when the file was last changed"""
+    subscriptions: dict[str, stuntboost_bpl.WatchSubscription] = {}
+    """Holds the library path as stored in the file and its subscription to the BPL watch service"""
+    pending: dict[str, float] = {}
+    """Normalized path of each changed library to the time.monotonic() of its last change"""
+    ready: set[str] = set()
+    """Normalized paths which are done changing, waiting for Blender to be idle"""
+    reload_times: dict[str, stuntboost_bpl.RollingTimings] = {}
+    """Library path to how long reloading it took"""
+    fingerprints: dict[str, "blend_diff.Fingerprint"] = {}
+    """Normalized path to the fingerprint of the version which is loaded"""
+    baselines: dict[str, concurrent.futures.Future] = {}
+    """Fingerprints of just loaded versions, still being computed in the background"""
+    checking: dict[str, concurrent.futures.Future] = {}
+    """Normalized paths which are compared to the loaded version right now"""
+    executor: concurrent.futures.ThreadPoolExecutor = None
 
     def __get_files(self) -> list[str]:
         result = []
@@ -24,46 +98,236 @@ class AssetLibReloader():
             result.append(lib.filepath)
         return result
 
-    def __reload(self, lib_path: str) -> None:
+    def __on_change(self, changed_path: str) -> None:
+        self.pending[changed_path] = time.monotonic()
+        if not bpy.app.timers.is_registered(SB_AssetLibHotReload.reload_pending):
+            bpy.app.timers.register(SB_AssetLibHotReload.reload_pending, first_interval=SETTLE_SEC)
+        if SHOW_PENDING_INDICATOR:
+            redraw_status_bar()
+
+    def pending_count(self) -> int:
+        return len(self.pending) + len(self.checking) + len(self.ready)
+
+    def __submit(self, function, *args) -> concurrent.futures.Future:
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1, "SB asset diff")
+        return self.executor.submit(function, *args)
+
+    def __remember(self, lib: bpy.types.Library) -> None:
+        """Fingerprints the loaded version of the library, later changes are compared to it"""
+        path = library_path(lib)
+        self.fingerprints.pop(path, None)
+        names = linked_names(lib)
+        if SKIP_UNCHANGED_LINKS and names is not None:
+            self.baselines[path] = self.__submit(blend_diff.fingerprint, path, names)
+
+    def __loaded_fingerprint(self, path: str) -> "blend_diff.Fingerprint":
+        future = self.baselines.get(path)
+        if future is not None and future.done():
+            del self.baselines[path]
+            if future.exception() is None:
+                self.fingerprints[path] = future.result()
+        return self.fingerprints.get(path)
+
+    def __check(self, paths: list[str]) -> None:
+        """Compares the changed libraries with the loaded versions, the ones which can't be compared
+        are reloaded"""
+        libraries = {library_path(i): i for i in bpy.data.libraries}
+        for path in paths:
+            lib = libraries.get(path)
+            old = self.__loaded_fingerprint(path)
+            names = linked_names(lib) if lib is not None else None
+            if old is None or names is None:
+                self.ready.add(path)
+            else:
+                self.checking[path] = self.__submit(blend_diff.compare, path, names, old)
+
+    def __collect_checks(self, force: bool) -> None:
+        for path, future in list(self.checking.items()):
+            if not future.done() and not force:
+                continue
+            del self.checking[path]
+            if not future.done() or future.exception() is not None:
+                if future.done():
+                    print(f"Comparing {path} failed, reloading it: {future.exception()}")
+                self.ready.add(path)
+                continue
+            unchanged, new = future.result()
+            if unchanged:
+                self.fingerprints[path] = new
+                print(f"Skipped hot reload of {path}, nothing this file links from it changed")
+            else:
+                self.ready.add(path)
+
+    def __take_settled(self, force: bool) -> list[str]:
+        """Removes the changed paths which are ready to be reloaded from pending and returns them.
+        force doesn't wait for them to settle."""
+        now = time.monotonic()
+        settled = []
+        for path, changed in list(self.pending.items()):
+            if now - changed < SETTLE_SEC and not force:
+                continue
+            if not os.path.exists(path):
+                if now - changed > MISSING_TIMEOUT_SEC:
+                    print(f"Warning, library {path} is gone, not hot reloading it.")
+                    del self.pending[path]
+                continue
+            settled.append(path)
+            del self.pending[path]
+        return settled
+
+    def __reload(self, paths: set[str]) -> None:
+        changed: list[bpy.types.Library] = []
         for i in bpy.data.libraries:
             lib: bpy.types.Library = i
-            if lib.filepath == lib_path:
-                print(f"Hot reloading {lib_path}")
+            if os.path.normcase(os.path.abspath(bpy.path.abspath(lib.filepath))) in paths:
+                changed.append(lib)
+        # a kit linked through several files is reloaded once, before the files using it
+        changed.sort(key=library_depth, reverse=True)
+        # reloading can replace the other library datablocks, look them up by name again
+        for name in [i.name for i in changed]:
+            lib = bpy.data.libraries.get(name)
+            if lib is None:
+                continue
+            path = lib.filepath
+            start = time.perf_counter()
+            try:
                 lib.reload()
-                return
-        print(f"Warning, could not hot reload library {lib_path}. Doesn't exist in current file.")
-
-    def update(self):
-        times = self.files
-        self.files = {}
-        for rel_path in self.__get_files():
-            full_path = bpy.path.abspath(rel_path)
-            current_modified_time = os.path.getmtime(full_path)
-            if rel_path in times:
-                if current_modified_time != times[rel_path]:
-                    self.__reload(rel_path)
-            self.files[rel_path] = current_modified_time
+            except RuntimeError as ex:
+                print(f"Warning, could not hot reload library {path}: {ex}")
+                continue
+            seconds = time.perf_counter() - start
+            self.reload_times.setdefault(path, stuntboost_bpl.RollingTimings(50)).add(seconds)
+            print(f"Hot reloaded {path} in {seconds:.2f} s")
+            lib = bpy.data.libraries.get(name)
+            if lib is not None:
+                self.__remember(lib)
+
+    def reload_pending(self, force: bool = False) -> float:
+        """Reloads everything that changed in one go, libraries other libraries link first.
+        Waits for Blender to be idle unless forced.
+        Returns when to look again, None if nothing is pending anymore."""
+        count = self.pending_count()
+        settled = self.__take_settled(force)
+        if SKIP_UNCHANGED_LINKS and not force:
+            self.__check(settled)
+        else:
+            self.ready |= set(settled)
+        self.__collect_checks(force)
+        if self.ready and (force or is_idle()):
+            ready = self.ready
+            self.ready = set()
+            self.__reload(ready)
+        if SHOW_PENDING_INDICATOR and count != self.pending_count():
+            redraw_status_bar()
+        if self.ready or self.checking:
+            return IDLE_RETRY_SEC
+        if not self.pending:
+            return None
+        return max(1.0, SETTLE_SEC - (time.monotonic() - max(self.pending.values())))
+
+    def print_reload_times(self) -> None:
+        for path, timings in sorted(self.reload_times.items(), key=lambda i: -i[1].total_seconds):
+            print(f"{path}: {timings.summary()}")
+
+    def update(self) -> None:
+        """Watches exactly the libraries of the current file"""
+        files = set(self.__get_files())
+        for rel_path in self.subscriptions.keys() - files:
+            stuntboost_bpl.unsubscribe(self.subscriptions.pop(rel_path))
+        for rel_path in files - self.subscriptions.keys():
+            self.subscriptions[rel_path] = stuntboost_bpl.subscribe(bpy.path.abspath(rel_path), self.__on_change)
+            for i in bpy.data.libraries:
+                lib: bpy.types.Library = i
+                if lib.filepath == rel_path:
+                    self.__remember(lib)
+
+    def clear(self) -> None:
+        for subscription in self.subscriptions.values():
+            stuntboost_bpl.unsubscribe(subscription)
+        self.subscriptions = {}
+        self.pending = {}
+        self.ready = set()
+        self.checking = {}
+        self.fingerprints = {}
+        self.baselines = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
 
 reloader = AssetLibReloader()
 
+
+class SB_ReloadPendingLibraries(bpy.types.Operator):
+    """Reloads the changed libraries now instead of waiting for Blender to be idle"""
+    bl_idname = SB_RELOAD_PENDING_OPERATOR
+    bl_label = "Reload changed libraries"
+    bpl_auto_load = True
+
+    def execute(self, _context: bpy.types.Context):
+        reloader.reload_pending(force=True)
+        return {'FINISHED'}
+
+class SB_PrintLibraryReloadTimes(bpy.types.Operator):
+    """Prints how long reloading each library took, the most expensive first"""
+    bl_idname = "wm.sb_print_library_reload_times"
+    bl_label = "Print library reload times"
+    bpl_auto_load = True
+
+    def execute(self, _context: bpy.types.Context):
+        reloader.print_reload_times()
+        return {'FINISHED'}
+
+def pending_indicator_draw(self: bpy.types.Header, _context: bpy.types.Context) -> None:
+    count = reloader.pending_count()
+    if count:
+        self.layout.operator(SB_RELOAD_PENDING_OPERATOR, icon='FILE_REFRESH',
+                             text=f"{count} changed librar{'y' if count == 1 else 'ies'}")
+
 class SB_AssetLibHotReload:
     @staticmethod
     @persistent
-    def poll_libraries():
+    def load_post_handler(_blend_path: str) -> None:
         reloader.update()
-        return CHECK_INTERVAL_SEC
+
+    @staticmethod
+    @persistent
+    def depsgraph_update_handler(_scene, _depsgraph) -> None:
+        # only look at the paths when libraries got linked or removed, this runs a lot
+        if len(bpy.data.libraries) != len(reloader.subscriptions):
+            reloader.update()
+
+    @staticmethod
+    def first_update():
+        reloader.update()
+        return None
+
+    @staticmethod
+    def reload_pending():
+        return reloader.reload_pending()
 
 
     @staticmethod
     def bpl_load():
         if bpy.app.background:
             return
-        bpy.app.timers.register(
-            function=SB_AssetLibHotReload.poll_libraries,
-            first_interval=CHECK_INTERVAL_SEC, persistent=True)
+        bpy.app.handlers.load_post.append(SB_AssetLibHotReload.load_post_handler)
+        bpy.app.handlers.depsgraph_update_post.append(SB_AssetLibHotReload.depsgraph_update_handler)
+        # bpy.data can't be accessed while add-ons get registered
+        bpy.app.timers.register(SB_AssetLibHotReload.first_update, first_interval=0)
+        if SHOW_PENDING_INDICATOR:
+            bpy.types.STATUSBAR_HT_header.prepend(pending_indicator_draw)
 
     @staticmethod
     def bpl_unload():
         if bpy.app.background:
             return
-        bpy.app.timers.unregister(SB_AssetLibHotReload.poll_libraries)
+        bpy.app.handlers.load_post.remove(SB_AssetLibHotReload.load_post_handler)
+        bpy.app.handlers.depsgraph_update_post.remove(SB_AssetLibHotReload.depsgraph_update_handler)
+        if bpy.app.timers.is_registered(SB_AssetLibHotReload.first_update):
+            bpy.app.timers.unregister(SB_AssetLibHotReload.first_update)
+        if bpy.app.timers.is_registered(SB_AssetLibHotReload.reload_pending):
+            bpy.app.timers.unregister(SB_AssetLibHotReload.reload_pending)
+        if SHOW_PENDING_INDICATOR:
+            bpy.types.STATUSBAR_HT_header.remove(pending_indicator_draw)
+        reloader.clear()
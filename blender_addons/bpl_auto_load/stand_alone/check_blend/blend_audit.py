@@ -0,0 +1,269 @@
+"""
+Audits every .blend file below a folder for meshes over the poly budget, object data
+which isn't named like SBE_SyncMeshName would name it and libraries which don't exist.
+Files are read with blend_info in a process pool instead of opening them in Blender.
+What was read from each file is cached by its content hash, so only files which changed
+since the last run are read again.
+
+    python blend_audit.py path/to/game --report audit.json
+    python blend_audit.py level.blend other.blend --report audit.csv --mesh-faces 20000
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+
+import blend_file
+import blend_info
+
+CACHE_VERSION = 1
+"""Bump when what's cached per file changes, old caches are ignored"""
+CACHE_NAME = "check_blend_cache.json"
+MESH_FACE_BUDGET = 50_000
+"""Faces a single mesh may have, 0 to not check"""
+FILE_FACE_BUDGET = 1_000_000
+"""Faces all meshes of a file may have together, 0 to not check"""
+HASH_CHUNK_SIZE = 1 << 20
+LFS_POINTER = b"version https://git-lfs"
+"""Start of the files git-lfs leaves when the content wasn't pulled"""
+SKIP_DIRS = {".git", "__pycache__"}
+
+
+class Problem:
+    __slots__ = ("path", "check", "name", "detail")
+
+    def __init__(self, path: str, check: str, name: str, detail: str):
+        self.path = path
+        self.check = check
+        """What failed: error, mesh_faces, file_faces, mesh_name or library"""
+        self.name = name
+        """Datablock or library the problem is about, empty if it's about the whole file"""
+        self.detail = detail
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class Budget:
+    def __init__(self, mesh_faces: int = MESH_FACE_BUDGET, file_faces: int = FILE_FACE_BUDGET):
+        self.mesh_faces = mesh_faces
+        self.file_faces = file_faces
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_file(path: str, known_hash: str) -> dict:
+    """Runs in the worker processes. Returns the content hash and, unless it's known_hash,
+    what blend_info read from the file or why it couldn't be read."""
+    content_hash = file_hash(path)
+    result = {"hash": content_hash}
+    if content_hash == known_hash:
+        return result
+    try:
+        info = blend_info.read_info(path).to_dict()
+        del info["path"] # the same content might be at several paths
+        result["info"] = info
+    except blend_file.BlendFileError as e:
+        with open(path, "rb") as file:
+            is_pointer = file.read(len(LFS_POINTER)) == LFS_POINTER
+        result["error"] = "git-lfs pointer, the file wasn't pulled" if is_pointer else str(e)
+    return result
+
+
+def find_blend_files(paths: list[str]) -> list[str]:
+    """The .blend files given and the ones below the folders given, as absolute paths"""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(os.path.abspath(path))
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = [i for i in dirs if i not in SKIP_DIRS]
+            files.extend(os.path.abspath(os.path.join(root, i)) for i in names if i.endswith(".blend"))
+    return sorted(set(files))
+
+
+def default_cache_path(paths: list[str]) -> str:
+    """Inside the .git folder of the repo the first path is in, so it's never committed"""
+    start = os.path.abspath(paths[0] if paths else ".")
+    if not os.path.isdir(start):
+        start = os.path.dirname(start)
+    folder = start
+    while not os.path.isdir(os.path.join(folder, ".git")):
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return os.path.join(start, "." + CACHE_NAME)
+        folder = parent
+    return os.path.join(folder, ".git", CACHE_NAME)
+
+
+def load_cache(path: str) -> dict:
+    """Absolute file path to its size, mtime, hash and results"""
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("files", {})
+
+
+def save_cache(path: str, files: dict) -> None:
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": CACHE_VERSION, "files": files}, file)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Writing the cache {path} failed with:")
+        print(e)
+
+
+def read_files(files: list[str], cache: dict, jobs: int) -> tuple[dict, int]:
+    """Results of every file, from the cache when size and mtime match, and how many files
+    were read. Files which were touched but have the same content aren't read, only hashed."""
+    results = {}
+    todo = []
+    read_count = 0
+    for path in files:
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            results[path] = {"error": str(e)}
+            continue
+        entry = cache.get(path)
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            results[path] = entry
+        else:
+            todo.append((path, stat))
+
+    def store(path: str, stat: os.stat_result, result: dict) -> None:
+        nonlocal read_count
+        if "info" in result or "error" in result:
+            read_count += 1
+        else:
+            result = {**cache[path], "hash": result["hash"]}
+        results[path] = {**result, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def known_hash(path: str) -> str:
+        return cache.get(path, {}).get("hash")
+
+    if len(todo) <= 1 or jobs <= 1:
+        # starting processes costs more than reading a single file
+        for path, stat in todo:
+            try:
+                store(path, stat, read_file(path, known_hash(path)))
+            except Exception as e:
+                # same as with the pool below
+                results[path] = {"error": f"reading failed with {type(e).__name__}: {e}"}
+        return results, read_count
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as executor:
+        futures = {executor.submit(read_file, path, known_hash(path)): (path, stat) for path, stat in todo}
+        for future in concurrent.futures.as_completed(futures):
+            path, stat = futures[future]
+            try:
+                store(path, stat, future.result())
+            except Exception as e:
+                # not cached, so it's tried again next time
+                results[path] = {"error": f"reading failed with {type(e).__name__}: {e}"}
+    return results, read_count
+
+
+def library_file(blend_path: str, library: str) -> str:
+    """Absolute path of a library path as Blender stores it, // is the folder of the file"""
+    library = library.replace("\\", "/")
+    if library.startswith("//"):
+        library = os.path.join(os.path.dirname(blend_path), library[2:])
+    return os.path.normpath(library)
+
+
+def check_file(path: str, result: dict, budget: Budget) -> list[Problem]:
+    if "info" not in result:
+        return [Problem(path, "error", "", result.get("error", "unknown"))]
+    info = result["info"]
+    problems = []
+    total_faces = 0
+    for mesh in info["meshes"]:
+        total_faces += mesh["faces"]
+        if budget.mesh_faces and budget.mesh_faces < mesh["faces"]:
+            problems.append(Problem(path, "mesh_faces", mesh["name"],
+                                    f"{mesh['faces']} faces, budget is {budget.mesh_faces}"))
+    if budget.file_faces and budget.file_faces < total_faces:
+        problems.append(Problem(path, "file_faces", "", f"{total_faces} faces, budget is {budget.file_faces}"))
+    # same rules as SBE_SyncMeshName in sync_mesh_name.py
+    for obj in info["objects"]:
+        if not obj["data_code"] or obj["data_is_asset"] or obj["data_is_linked"] or 1 < obj["data_users"]:
+            continue
+        if obj["data_name"] != obj["name"] + "_mesh":
+            problems.append(Problem(path, "mesh_name", obj["name"],
+                                    f"data is named {obj['data_name']}, expected {obj['name']}_mesh"))
+    for library in info["libraries"]:
+        if not os.path.isfile(library_file(path, library)):
+            problems.append(Problem(path, "library", library, f"{library_file(path, library)} doesn't exist"))
+    return problems
+
+
+def write_report(path: str, results: dict, problems: list[Problem]) -> None:
+    """CSV with one problem per row if path ends with .csv, JSON with everything read otherwise"""
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        if path.lower().endswith(".csv"):
+            writer = csv.writer(file)
+            writer.writerow(Problem.__slots__)
+            for problem in problems:
+                writer.writerow([getattr(problem, key) for key in Problem.__slots__])
+            return
+        report = {
+            "files": {i: {key: value for key, value in results[i].items() if key not in ("size", "mtime")}
+                      for i in sorted(results)},
+            "problems": [i.to_dict() for i in problems],
+        }
+        json.dump(report, file, indent=1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="*", default=["."], help=".blend files or folders to search for them")
+    parser.add_argument("--report", help="write the problems to a .csv or everything to a .json file")
+    parser.add_argument("--cache", help=f"cache file, defaults to {CACHE_NAME} in the .git folder")
+    parser.add_argument("--no-cache", action="store_true", help="read every file and don't write the cache")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="processes reading files")
+    parser.add_argument("--mesh-faces", type=int, default=MESH_FACE_BUDGET, help="face budget per mesh, 0 to not check")
+    parser.add_argument("--file-faces", type=int, default=FILE_FACE_BUDGET, help="face budget per file, 0 to not check")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    files = find_blend_files(args.paths)
+    cache_path = args.cache or default_cache_path(args.paths)
+    cache = {} if args.no_cache else load_cache(cache_path)
+    results, read_count = read_files(files, cache, args.jobs)
+    if not args.no_cache:
+        save_cache(cache_path, {key: value for key, value in results.items() if "hash" in value})
+
+    budget = Budget(args.mesh_faces, args.file_faces)
+    problems = []
+    for path in files:
+        problems.extend(check_file(path, results[path], budget))
+    for problem in problems:
+        print(f"{problem.path}\t{problem.check}\t{problem.name}\t{problem.detail}")
+    if args.report:
+        write_report(args.report, results, problems)
+    print(f"Audited {len(files)} files, read {read_count}, {len(problems)} problems "
+          f"in {time.perf_counter() - start:.2f} s")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+Tells whether the IDs a file links from a library changed between two versions of that
+library, so saves which only touched other datablocks don't need a reload.
+Each linked ID is hashed together with its DATA blocks and every ID it points to.
+Pointers are stored as memory addresses which change on every save, they are hashed
+as what they point to instead.
+"""
+
+import hashlib
+import struct
+
+import blend_file
+
+RAW_SCAN_LIMIT = 1 << 16
+"""Raw data blocks up to this size are searched for pointers, bigger ones are attribute arrays"""
+ID_LINKS = ("next", "prev", "newid", "orig_id")
+"""Pointers every ID has to its neighbours in the file and to runtime copies, not something it depends on"""
+
+
+class Fingerprint:
+    """Hashes of the linked IDs of one library version and everything they depend on"""
+
+    def __init__(self, roots: set[str], hashes: dict[str, str]):
+        self.roots = roots
+        """Names of the linked IDs, without the two letter code"""
+        self.hashes = hashes
+        """Code and name of each ID to the hash of its blocks"""
+
+
+def pointer_positions(blend: blend_file.BlendFile, block: blend_file.Block, data: memoryview,
+                      addresses: dict[int, tuple[int, int]]) -> list[int]:
+    """Offsets of the pointers in the block. Raw data has no struct layout, small blocks are
+    searched for values which are addresses of other blocks."""
+    sdna = blend.sdna
+    if 0 < block.sdna < len(sdna.structs):
+        dna_struct = sdna.structs[block.sdna]
+        if dna_struct.size * block.count == block.size:
+            inner = sdna.pointer_offsets(dna_struct)
+            return [i * dna_struct.size + j for i in range(block.count) for j in inner]
+    pointer_size = blend.pointer_size
+    if block.size <= RAW_SCAN_LIMIT and block.size % pointer_size == 0:
+        count = block.size // pointer_size
+        words = struct.unpack_from(f"{blend.endian}{count}{'Q' if pointer_size == 8 else 'I'}", data)
+        return [i * pointer_size for i, word in enumerate(words) if word in addresses]
+    return []
+
+
+def hash_id(blend: blend_file.BlendFile, index: int, keys: list[str],
+            addresses: dict[int, tuple[int, int]]) -> tuple[str, set[int]]:
+    """Hash of one ID and its DATA blocks, and the indices of the IDs it points to"""
+    id_blocks = blend.ids[index]
+    digest = hashlib.blake2b(digest_size=16)
+    targets = set()
+    pointer_format = struct.Struct(blend.endian + ("Q" if blend.pointer_size == 8 else "I"))
+    id_struct = blend.sdna.by_name["ID"]
+    links = {id_struct.by_name[i].offset for i in ID_LINKS if i in id_struct.by_name}
+    for block in id_blocks.blocks:
+        data = blend.block_data(block)
+        digest.update(struct.pack("<4siqq", block.code, block.sdna, block.size, block.count))
+        positions = pointer_positions(blend, block, data, addresses)
+        if not positions:
+            digest.update(data)
+            continue
+        content = bytearray(data)
+        for position in positions:
+            value = pointer_format.unpack_from(content, position)[0]
+            if value == 0:
+                continue
+            pointer_format.pack_into(content, position, 0)
+            if block is id_blocks.blocks[0] and position in links:
+                continue
+            target = addresses.get(value)
+            if target is None:
+                label = "?" # runtime data, nothing to compare
+            else:
+                if target[0] != index:
+                    targets.add(target[0])
+                label = f"{keys[target[0]]}:{target[1]}"
+            digest.update(f"{position}>{label};".encode("utf-8"))
+        digest.update(content)
+    return digest.hexdigest(), targets
+
+
+def fingerprint(path: str, names: set[str]) -> Fingerprint:
+    """Hashes the IDs named names and everything they point to, directly or not.
+    Raises blend_file.BlendFileError for files this can't read."""
+    with blend_file.BlendFile(path) as blend:
+        ids = blend.ids
+        addresses: dict[int, tuple[int, int]] = {}
+        """Address of each block to the index of its ID and its index in the ID's blocks"""
+        keys = []
+        seen_keys = set()
+        for i, id_blocks in enumerate(ids):
+            for j, block in enumerate(id_blocks.blocks):
+                addresses[block.old] = (i, j)
+            key = id_blocks.code + id_blocks.name
+            # IDs linked from other libraries might have the same name as a local one
+            while key in seen_keys:
+                key += "#"
+            seen_keys.add(key)
+            keys.append(key)
+
+        hashes = {f"missing:{i}": "" for i in names}
+        todo = []
+        for i, id_blocks in enumerate(ids):
+            if id_blocks.name in names:
+                hashes.pop(f"missing:{id_blocks.name}", None)
+                todo.append(i)
+        done = set(todo)
+        while todo:
+            index = todo.pop()
+            hashes[keys[index]], targets = hash_id(blend, index, keys, addresses)
+            for target in targets - done:
+                done.add(target)
+                todo.append(target)
+        return Fingerprint(set(names), hashes)
+
+
+def is_unchanged(old: Fingerprint, new: Fingerprint) -> bool:
+    """True if everything new depends on has the same hash in old"""
+    if old is None or not new.roots <= old.roots:
+        return False
+    return all(old.hashes.get(key) == value for key, value in new.hashes.items())
+
+
+def compare(path: str, names: set[str], old: Fingerprint) -> tuple[bool, Fingerprint]:
+    """Whether the IDs named names are unchanged since old was taken, and the new fingerprint"""
+    new = fingerprint(path, names)
+    return is_unchanged(old, new), new
@@ -0,0 +1,412 @@
+"""
+Reads .blend files without Blender. The file is memory mapped, block data is handed
+out as memoryviews into the mapping and the SDNA (the struct layouts stored in the
+file) is only parsed when something asks for it.
+Compressed files are decompressed into memory first, gzip always works, zstd needs
+python 3.14 or the zstandard module.
+Doesn't need bpy, so it also works in worker threads and outside of Blender.
+"""
+
+import gzip
+import mmap
+import struct
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+BASIC_TYPES = {
+    "char": "b", "uchar": "B", "int8_t": "b", "uint8_t": "B", "bool": "?",
+    "short": "h", "ushort": "H", "int16_t": "h", "uint16_t": "H",
+    "int": "i", "uint": "I", "int32_t": "i", "uint32_t": "I",
+    "int64_t": "q", "uint64_t": "Q", "float": "f", "double": "d",
+}
+"""SDNA type names to struct formats"""
+CORRUPT_ERRORS = (struct.error, IndexError, KeyError, ValueError, UnicodeDecodeError)
+"""What parsing a truncated or corrupt file raises, turned into BlendFileError where the file is parsed"""
+
+
+def decompress_zstd(file) -> bytes:
+    try:
+        from compression import zstd # pylint: disable=import-outside-toplevel
+        try:
+            return zstd.decompress(file.read())
+        except zstd.ZstdError as ex:
+            raise BlendFileError(f"{file.name}: truncated or corrupt zstd data: {ex}") from ex
+    except ImportError:
+        pass
+    try:
+        import zstandard # pylint: disable=import-outside-toplevel
+    except ImportError as ex:
+        raise BlendFileError(f"{file.name} is zstd compressed, install zstandard to read it") from ex
+    try:
+        # Blender writes several frames so it can seek in the file
+        return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True).readall()
+    except zstandard.ZstdError as ex:
+        raise BlendFileError(f"{file.name}: truncated or corrupt zstd data: {ex}") from ex
+
+
+class BlendFileError(Exception):
+    """Not a .blend file, or one this reader doesn't understand"""
+
+
+class Block:
+    """One file block, the header and where its data is in the file"""
+    __slots__ = ("code", "size", "old", "sdna", "count", "offset")
+
+    def __init__(self, code: bytes, size: int, old: int, sdna: int, count: int, offset: int):
+        self.code = code
+        self.size = size
+        self.old = old
+        """Address the data had in memory when it was saved, pointers in other blocks refer to it"""
+        self.sdna = sdna
+        """Index of the struct in the SDNA"""
+        self.count = count
+        """Number of structs in the block"""
+        self.offset = offset
+
+    def is_id(self) -> bool:
+        """ID blocks have two letter codes like b"OB\\0\\0" """
+        return self.code[2:] == b"\0\0"
+
+
+class Field:
+    __slots__ = ("name", "type", "offset", "size", "is_pointer", "length")
+
+    def __init__(self, name: str, type_name: str, offset: int, size: int, is_pointer: bool, length: int):
+        self.name = name
+        """Without pointer stars and array sizes"""
+        self.type = type_name
+        self.offset = offset
+        self.size = size
+        """Of the whole field, all array items"""
+        self.is_pointer = is_pointer
+        self.length = length
+        """Array items, 1 if it's no array"""
+
+
+class DnaStruct:
+    def __init__(self, name: str, size: int, fields: list[Field]):
+        self.name = name
+        self.size = size
+        self.fields = fields
+        self.by_name = {i.name: i for i in fields}
+        self.pointer_offsets: list[int] = None
+        """Offsets of all pointers, including the ones of embedded structs, see SDNA.pointer_offsets"""
+
+
+class SDNA:
+    """Struct layouts from the DNA1 block"""
+
+    def __init__(self, data: memoryview, endian: str, pointer_size: int):
+        self.endian = endian
+        self.pointer_size = pointer_size
+        self.structs: list[DnaStruct] = []
+        self.by_name: dict[str, DnaStruct] = {}
+        self.__parse(data)
+
+    def __parse(self, data: memoryview) -> None:
+        offset = 0
+        def expect(tag: bytes) -> None:
+            nonlocal offset
+            offset = (offset + 3) & ~3
+            if bytes(data[offset:offset + 4]) != tag:
+                raise BlendFileError(f"broken SDNA, expected {tag}")
+            offset += 4
+        def read_int(fmt: str) -> int:
+            nonlocal offset
+            value = struct.unpack_from(self.endian + fmt, data, offset)[0]
+            offset += struct.calcsize(fmt)
+            return value
+        def read_strings() -> list[str]:
+            nonlocal offset
+            result = []
+            for _ in range(read_int("i")):
+                end = bytes(data[offset:offset + 512]).index(b"\0")
+                result.append(bytes(data[offset:offset + end]).decode("latin-1"))
+                offset += end + 1
+            return result
+
+        expect(b"SDNA")
+        expect(b"NAME")
+        names = read_strings()
+        expect(b"TYPE")
+        types = read_strings()
+        expect(b"TLEN")
+        lengths = struct.unpack_from(f"{self.endian}{len(types)}h", data, offset)
+        offset += 2 * len(types)
+        expect(b"STRC")
+        for _ in range(read_int("i")):
+            type_index, field_count = struct.unpack_from(self.endian + "hh", data, offset)
+            offset += 4
+            pairs = struct.unpack_from(f"{self.endian}{field_count * 2}h", data, offset)
+            offset += 4 * field_count
+            fields = []
+            field_offset = 0
+            for i in range(0, len(pairs), 2):
+                field = self.__field(names[pairs[i + 1]], types[pairs[i]], lengths[pairs[i]], field_offset)
+                fields.append(field)
+                field_offset += field.size
+            dna_struct = DnaStruct(types[type_index], lengths[type_index], fields)
+            self.structs.append(dna_struct)
+            self.by_name[dna_struct.name] = dna_struct
+
+    def __field(self, name: str, type_name: str, type_size: int, offset: int) -> Field:
+        is_pointer = name.startswith("*") or name.startswith("(*")
+        length = 1
+        base = name
+        if "[" in name:
+            base = name[:name.index("[")]
+            for dimension in name[name.index("["):].strip("[]").split("]["):
+                length *= int(dimension)
+        base = base.strip("*()")
+        if name.startswith("(*"):
+            base = base.split(")")[0]
+        size = (self.pointer_size if is_pointer else type_size) * length
+        return Field(base, type_name, offset, size, is_pointer, length)
+
+    def pointer_offsets(self, dna_struct: DnaStruct) -> list[int]:
+        """Where the pointers are in one struct, embedded structs included"""
+        if dna_struct.pointer_offsets is None:
+            offsets = []
+            for field in dna_struct.fields:
+                if field.is_pointer:
+                    offsets += range(field.offset, field.offset + field.size, self.pointer_size)
+                elif field.type in self.by_name:
+                    embedded = self.by_name[field.type]
+                    inner = self.pointer_offsets(embedded)
+                    for i in range(field.length):
+                        offsets += [field.offset + i * embedded.size + j for j in inner]
+            dna_struct.pointer_offsets = offsets
+        return dna_struct.pointer_offsets
+
+
+class StructView:
+    """One struct in the file data, fields are read when they're accessed"""
+    __slots__ = ("blend", "dna", "data")
+
+    def __init__(self, blend: "BlendFile", dna: DnaStruct, data: memoryview):
+        self.blend = blend
+        self.dna = dna
+        self.data = data
+
+    def __getitem__(self, name: str):
+        return self.blend.read_field(self.data, self.dna.by_name[name])
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.dna.by_name
+
+    def get(self, *names: str, default=None):
+        """The first of the fields which exists, for fields which got renamed between versions"""
+        for name in names:
+            if name in self.dna.by_name:
+                return self[name]
+        return default
+
+
+class IdBlocks:
+    """An ID block and the DATA blocks written right after it, which belong to the ID"""
+    __slots__ = ("code", "name", "blocks")
+
+    def __init__(self, code: str, name: str, blocks: list[Block]):
+        self.code = code
+        self.name = name
+        """Without the two letter code"""
+        self.blocks = blocks
+
+    def is_linked(self) -> bool:
+        """Placeholder for an ID this file links from a library"""
+        return self.blocks[0].code == b"ID\0\0"
+
+
+class BlendFile:
+    """Use as context manager, memoryviews of the data must not be used after closing it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.__file = open(path, "rb") # pylint: disable=consider-using-with
+        self.__map: mmap.mmap = None
+        self.data: memoryview = None
+        """The whole file, decompressed"""
+        self.compression: str = None
+        try:
+            magic = self.__file.read(4)
+            self.__file.seek(0)
+            if magic.startswith(GZIP_MAGIC):
+                self.compression = "gzip"
+                with gzip.GzipFile(fileobj=self.__file) as gzip_file:
+                    self.data = memoryview(gzip_file.read())
+            elif magic == ZSTD_MAGIC:
+                self.compression = "zstd"
+                self.data = memoryview(decompress_zstd(self.__file))
+            else:
+                self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.data = memoryview(self.__map)
+            self.__read_header()
+        except (ValueError, EOFError, zlib.error, gzip.BadGzipFile) as ex:
+            self.close()
+            raise BlendFileError(f"{path} can't be read: {ex}") from ex
+        except (OSError, BlendFileError):
+            self.close()
+            raise
+        self.__blocks: list[Block] = None
+        self.__sdna: SDNA = None
+        self.__ids: list[IdBlocks] = None
+        self.__addresses: dict[int, Block] = None
+
+    def __enter__(self) -> "BlendFile":
+        return self
+
+    def __exit__(self, _type, value, _traceback) -> None:
+        self.close()
+        # whatever was read from a corrupt file might be out of range, not only what's checked here
+        if isinstance(value, CORRUPT_ERRORS):
+            raise BlendFileError(f"{self.path}: truncated or corrupt: {value!r}") from value
+
+    def close(self) -> None:
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        if self.__map is not None:
+            try:
+                self.__map.close()
+            except BufferError:
+                pass # block data is still used somewhere, it's unmapped once that's gone
+            self.__map = None
+        self.__file.close()
+
+    def __read_header(self) -> None:
+        header = bytes(self.data[:17])
+        if not header.startswith(b"BLENDER"):
+            raise BlendFileError(f"{self.path} is not a .blend file")
+        if header[7:9].isdigit():
+            # Blender 5.0+: BLENDER17-01v0500, 64 bit lengths in the block headers
+            if header[9:12] != b"-01":
+                raise BlendFileError(f"{self.path} has unknown file format {header[9:12]}")
+            self.pointer_size = 8
+            self.endian = "<" if header[12:13] == b"v" else ">"
+            self.version = int(header[13:17])
+            self.header_size = int(header[7:9])
+            self.__block_format = struct.Struct(self.endian + "4siQqq")
+            self.__large_headers = True
+        else:
+            self.pointer_size = 8 if header[7:8] == b"-" else 4
+            self.endian = "<" if header[8:9] == b"v" else ">"
+            self.version = int(header[9:12])
+            self.header_size = 12
+            pointer = "Q" if self.pointer_size == 8 else "I"
+            self.__block_format = struct.Struct(self.endian + "4si" + pointer + "ii")
+            self.__large_headers = False
+
+    @property
+    def blocks(self) -> list[Block]:
+        if self.__blocks is None:
+            self.__blocks = []
+            block_format = self.__block_format
+            offset = self.header_size
+            end = len(self.data)
+            while offset + block_format.size <= end:
+                if self.__large_headers:
+                    code, sdna, old, size, count = block_format.unpack_from(self.data, offset)
+                else:
+                    code, size, old, sdna, count = block_format.unpack_from(self.data, offset)
+                offset += block_format.size
+                if code != b"ENDB" and (size < 0 or end < offset + size):
+                    raise BlendFileError(f"{self.path}: truncated or corrupt, block {code} ends after the end of the file")
+                self.__blocks.append(Block(code, size, old, sdna, count, offset))
+                if code == b"ENDB":
+                    break
+                offset += size
+        return self.__blocks
+
+    def block_data(self, block: Block) -> memoryview:
+        return self.data[block.offset:block.offset + block.size]
+
+    @property
+    def sdna(self) -> SDNA:
+        if self.__sdna is None:
+            block = next((i for i in self.blocks if i.code == b"DNA1"), None)
+            if block is None:
+                raise BlendFileError(f"{self.path} has no SDNA")
+            try:
+                self.__sdna = SDNA(self.block_data(block), self.endian, self.pointer_size)
+            except CORRUPT_ERRORS as ex:
+                raise BlendFileError(f"{self.path}: truncated or corrupt SDNA: {ex!r}") from ex
+        return self.__sdna
+
+    def read_pointer(self, data: memoryview, offset: int) -> int:
+        return struct.unpack_from(self.endian + ("Q" if self.pointer_size == 8 else "I"), data, offset)[0]
+
+    def block_at(self, address: int) -> Block:
+        """The block a pointer points to, None for null and runtime pointers"""
+        if self.__addresses is None:
+            # ENDB and some runtime blocks are written with a null address
+            self.__addresses = {i.old: i for i in self.blocks if i.old}
+        return self.__addresses.get(address) if address else None
+
+    def view(self, block: Block, index: int = 0) -> StructView:
+        """Struct number index in the block"""
+        if not 0 <= block.sdna < len(self.sdna.structs):
+            raise BlendFileError(f"{self.path}: corrupt block {block.code}, unknown struct {block.sdna}")
+        dna = self.sdna.structs[block.sdna]
+        start = block.offset + index * dna.size
+        if block.offset + block.size < start + dna.size:
+            raise BlendFileError(f"{self.path}: corrupt block {block.code}, too small for {dna.name}")
+        return StructView(self, dna, self.data[start:start + dna.size])
+
+    def read_field(self, data: memoryview, field: Field):
+        """Value of a field of the struct in data. Pointers are returned as addresses,
+        char arrays as strings and embedded structs as StructViews."""
+        try:
+            return self.__read_field(data, field)
+        except CORRUPT_ERRORS as ex:
+            raise BlendFileError(f"{self.path}: corrupt field {field.name}: {ex!r}") from ex
+
+    def __read_field(self, data: memoryview, field: Field):
+        if field.is_pointer:
+            pointer = "Q" if self.pointer_size == 8 else "I"
+            values = struct.unpack_from(f"{self.endian}{field.length}{pointer}", data, field.offset)
+            return values[0] if field.length == 1 else values
+        if field.type == "char" and field.length > 1:
+            text = bytes(data[field.offset:field.offset + field.size])
+            return text.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+        dna = self.sdna.by_name.get(field.type)
+        if dna is not None:
+            views = [StructView(self, dna, data[field.offset + i * dna.size:field.offset + (i + 1) * dna.size])
+                     for i in range(field.length)]
+            return views[0] if field.length == 1 else views
+        fmt = BASIC_TYPES.get(field.type)
+        if fmt is None:
+            raise BlendFileError(f"can't read field {field.name} of type {field.type}")
+        values = struct.unpack_from(f"{self.endian}{field.length}{fmt}", data, field.offset)
+        return values[0] if field.length == 1 else values
+
+    def id_name(self, block: Block) -> str:
+        """Name of the ID in an ID block, with the two letter code"""
+        field = self.sdna.by_name["ID"].by_name["name"]
+        # every ID struct starts with the ID
+        name = bytes(self.data[block.offset + field.offset:block.offset + field.offset + field.size])
+        return name.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+
+    @property
+    def ids(self) -> list[IdBlocks]:
+        if self.__ids is None:
+            self.__ids = []
+            current: IdBlocks = None
+            try:
+                field = self.sdna.by_name["ID"].by_name["name"]
+            except KeyError as ex:
+                raise BlendFileError(f"{self.path}: corrupt SDNA, there's no ID struct") from ex
+            data = self.data
+            for block in self.blocks:
+                if block.code[2:] == b"\0\0":
+                    # same as id_name(), this runs for every ID in the file
+                    start = block.offset + field.offset
+                    name = bytes(data[start:start + field.size]).split(b"\0", 1)[0].decode("utf-8", errors="replace")
+                    current = IdBlocks(name[:2], name[2:], [block])
+                    self.__ids.append(current)
+                elif block.code == b"DATA" and current is not None:
+                    current.blocks.append(block)
+                else:
+                    current = None
+        return self.__ids
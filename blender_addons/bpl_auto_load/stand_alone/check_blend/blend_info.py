@@ -0,0 +1,150 @@
+"""
+Mesh statistics, object data names, libraries and linked IDs of a .blend file, read with blend_file instead
+of opening the file in Blender. Only the ID blocks are looked at, the mesh data itself
+is never touched.
+
+    python blend_info.py level.blend
+"""
+
+import sys
+import os
+
+import blend_file
+
+
+class MeshStats:
+    __slots__ = ("name", "vertices", "edges", "faces", "loops")
+
+    def __init__(self, name: str, vertices: int, edges: int, faces: int, loops: int):
+        self.name = name
+        self.vertices = vertices
+        self.edges = edges
+        self.faces = faces
+        self.loops = loops
+        """Face corners"""
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class ObjectData:
+    """A local object and the datablock it uses, what SBE_SyncMeshName looks at"""
+    __slots__ = ("name", "data_code", "data_name", "data_users", "data_is_asset", "data_is_linked")
+
+    def __init__(self, name: str, data_code: str, data_name: str, data_users: int,
+                 data_is_asset: bool, data_is_linked: bool):
+        self.name = name
+        self.data_code = data_code
+        """Two letter code of the data, ME for meshes. Empty for objects without data"""
+        self.data_name = data_name
+        self.data_users = data_users
+        self.data_is_asset = data_is_asset
+        self.data_is_linked = data_is_linked
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class LinkedId:
+    __slots__ = ("code", "name", "library")
+
+    def __init__(self, code: str, name: str, library: str):
+        self.code = code
+        self.name = name
+        self.library = library
+        """Path of the library as stored in the file, usually relative to it with a leading //"""
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+
+class BlendInfo:
+    def __init__(self, path: str, version: int, compression: str):
+        self.path = path
+        self.version = version
+        """Blender version which saved the file, 403 for 4.3"""
+        self.compression = compression
+        self.meshes: list[MeshStats] = []
+        self.objects: list[ObjectData] = []
+        self.libraries: list[str] = []
+        self.linked: list[LinkedId] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "version": self.version,
+            "compression": self.compression,
+            "meshes": [i.to_dict() for i in self.meshes],
+            "objects": [i.to_dict() for i in self.objects],
+            "libraries": self.libraries,
+            "linked": [i.to_dict() for i in self.linked],
+        }
+
+
+def read_mesh(blend: blend_file.BlendFile, id_blocks: blend_file.IdBlocks) -> MeshStats:
+    mesh = blend.view(id_blocks.blocks[0])
+    # the counts got renamed in Blender 4.0, older files use the tot* names
+    return MeshStats(
+        id_blocks.name,
+        mesh.get("verts_num", "totvert", default=0),
+        mesh.get("edges_num", "totedge", default=0),
+        mesh.get("faces_num", "totpoly", "totface", default=0),
+        mesh.get("corners_num", "totloop", default=0),
+    )
+
+
+def read_object(blend: blend_file.BlendFile, id_blocks: blend_file.IdBlocks) -> ObjectData:
+    block = blend.block_at(blend.view(id_blocks.blocks[0])["data"])
+    if block is None:
+        return ObjectData(id_blocks.name, "", "", 0, False, False)
+    name = blend.id_name(block)
+    view = blend.view(block)
+    # data linked from a library is a bare ID placeholder, everything else starts with one
+    data_id = view if block.code == b"ID\0\0" else view["id"]
+    return ObjectData(id_blocks.name, name[:2], name[2:], data_id.get("us", default=1),
+                      bool(data_id.get("asset_data", default=0)), block.code == b"ID\0\0")
+
+
+def read_info(path: str) -> BlendInfo:
+    """Raises blend_file.BlendFileError for files which can't be read"""
+    with blend_file.BlendFile(path) as blend:
+        info = BlendInfo(path, blend.version, blend.compression)
+        library_paths: dict[int, str] = {}
+        """Address of each library block to its path"""
+        for id_blocks in blend.ids:
+            block = id_blocks.blocks[0]
+            if block.code == b"LI\0\0":
+                library_paths[block.old] = blend.view(block).get("filepath", "name", default="")
+                info.libraries.append(library_paths[block.old])
+        for id_blocks in blend.ids:
+            code = id_blocks.blocks[0].code
+            if id_blocks.is_linked():
+                # placeholders are written as bare ID structs
+                library = library_paths.get(blend.view(id_blocks.blocks[0])["lib"], "")
+                info.linked.append(LinkedId(id_blocks.code, id_blocks.name, library))
+            elif code == b"ME\0\0":
+                info.meshes.append(read_mesh(blend, id_blocks))
+            elif code == b"OB\0\0":
+                info.objects.append(read_object(blend, id_blocks))
+        return info
+
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        print(f"usage: {os.path.basename(sys.argv[0])} file.blend [file.blend ...]")
+        return 2
+    for path in sys.argv[1:]:
+        info = read_info(path)
+        print(f"{path} (Blender {info.version // 100}.{info.version % 100})")
+        # same as SB_PrintByVertCount in print_by_vert_count.py
+        for mesh in sorted(info.meshes, key=lambda i: i.vertices, reverse=True)[:50]:
+            print(f"Vertices {mesh.vertices}\tFaces {mesh.faces}\t {mesh.name}")
+        for library in info.libraries:
+            print(f"Library {library}")
+        for linked in info.linked:
+            print(f"Linked {linked.code} {linked.name} from {linked.library}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
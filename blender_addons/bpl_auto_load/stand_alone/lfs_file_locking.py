@@ -7,17 +7,36 @@ committed/unchanged files.
 
 import sys
 import os
+import posixpath
+import stat
 import subprocess
 import json
 import enum
+import concurrent.futures
+import threading
+import time
 
 # pylint: disable=import-error
 import bpy
 from bpy.app.handlers import persistent
+import stuntboost_bpl
 # pylint: enable=import-error
 
-CHECK_INTERVAL_SEC = 60 * 1
-"""Don't check too often as this blocks the ui and will cause a little stutter"""
+CHECK_INTERVAL_SEC = 60
+"""Local changes trigger a check right away, this only picks up locks others took on the server"""
+GIT_TIMEOUT_SEC = 10
+LFS_TIMEOUT_SEC = 30
+"""LFS commands talk to the server, give slow servers some time before giving up"""
+JOB_POLL_SEC = 0.1
+"""How often the main thread looks for finished git commands"""
+UPSTREAM_TTL_SEC = 30
+"""How long the commit of the upstream branch on the remote is trusted before asking again"""
+UNLOCK_BATCH_SIZE = 25
+"""Paths per git lfs unlock call when unlocking many files"""
+UNLOCK_WORKERS = 4
+"""Unlock calls running at the same time, each one is a round trip to the LFS server"""
+ATTR_CHUNK_SIZE = 32
+"""Paths written to git check-attr before reading its answers, keeps the pipes from filling up"""
 
 
 SB_LOCK_OPERATOR = "wm.sb_lfs_lock"
@@ -38,7 +57,8 @@ else:
 
 def message_box(message = "", title = "Message Box", icon = 'INFO'):
     def draw(self, _context: bpy.types.Context):
-        self.layout.label(text=message)
+        for line in message.splitlines():
+            self.layout.label(text=line)
     bpy.context.window_manager.popup_menu(draw, title = title, icon = icon)
 
 class LockStatus(enum.Enum):
@@ -47,6 +67,8 @@ class LockStatus(enum.Enum):
     LOCKED_BY_OTHER = 3
     INVALID = 4
     NOT_TRACKED = 5
+    NOT_LOCKABLE = 6
+    """In a repo, but .gitattributes doesn't mark it lockable"""
 
 class GitStatus(enum.Enum):
     UNCHANGED = 1
@@ -54,22 +76,17 @@ class GitStatus(enum.Enum):
     UNKNOWN = 3
 
 CURRENT_STATE = LockStatus.NOT_TRACKED
+LIBRARY_STATES: dict[str, LockStatus] = {}
+"""Absolute path of each linked library to its lock status"""
 
 def ignore_file() -> bool:
-    """true for STUNTBOOST specific files which don't need locking"""
-    # TODO maybe rely on .gitignore instead, so this is more general
-    return bpy.data.filepath and bpy.data.filepath.find(".export") != -1
+    """true for files which don't need locking, like the STUNTBOOST export files.
+    Comes from the lockable attribute, so it's only known after the first status check."""
+    return bool(bpy.data.filepath) and CURRENT_STATE == LockStatus.NOT_LOCKABLE
 
 
-GIT_ROOT = None
 def get_git_root(file: str) -> str:
-    global GIT_ROOT
-    if GIT_ROOT and file.find(GIT_ROOT):
-        return GIT_ROOT
-    path = subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], cwd=os.path.dirname(file))
-    path = path.decode(sys.stdout.encoding).strip()
-    GIT_ROOT = path
-    return path
+    return get_repo(file).root
 
 
 class SB_LocksNotTrackedTopBarMenu(bpy.types.Menu):
@@ -77,7 +94,7 @@ class SB_LocksNotTrackedTopBarMenu(bpy.types.Menu):
     bl_label = "LFS: Not Tracked"
     bpl_auto_load = True
     def draw(self, _context: bpy.types.Context) -> None:
-        pass
+        draw_library_locks(self.layout)
 
 class SB_LocksNotLockTopBarMenu(bpy.types.Menu):
     bl_idname = "SB_MT_locks_no_lock_topbar_menu"
@@ -86,6 +103,7 @@ class SB_LocksNotLockTopBarMenu(bpy.types.Menu):
     def draw(self, _context: bpy.types.Context) -> None:
         self.layout.operator(SB_LOCK_OPERATOR)
         self.layout.operator(SB_UNLOCK_ALL_OPERATOR)
+        draw_library_locks(self.layout)
 
 class SB_LocksLockedTopBarMenu(bpy.types.Menu):
     bl_idname = "SB_MT_locks_locked_topbar_menu"
@@ -93,6 +111,7 @@ class SB_LocksLockedTopBarMenu(bpy.types.Menu):
     bpl_auto_load = True
     def draw(self, _context: bpy.types.Context) -> None:
         self.layout.operator(SB_UNLOCK_ALL_OPERATOR)
+        draw_library_locks(self.layout)
 
 
 class SB_LocksOwnLockTopBarMenu(bpy.types.Menu):
@@ -102,13 +121,24 @@ class SB_LocksOwnLockTopBarMenu(bpy.types.Menu):
     def draw(self, _context: bpy.types.Context) -> None:
         self.layout.operator(SB_UNLOCK_OPERATOR)
         self.layout.operator(SB_UNLOCK_ALL_OPERATOR)
+        draw_library_locks(self.layout)
 
 class SB_LocksInvalidTopBarMenu(bpy.types.Menu):
     bl_idname = "SB_MT_locks_inclaid_lock_topbar_menu"
     bl_label = "LFS: ERROR, check manually"
     bpl_auto_load = True
     def draw(self, _context: bpy.types.Context) -> None:
-        pass
+        draw_library_locks(self.layout)
+
+def draw_library_locks(layout: bpy.types.UILayout) -> None:
+    if not LIBRARY_STATES:
+        return
+    layout.separator()
+    for path, state in sorted(LIBRARY_STATES.items()):
+        icon = SB_GREEN_ICON_NAME if state == LockStatus.LOCKED_BY_US else SB_RED_ICON_NAME
+        if state in (LockStatus.NOT_TRACKED, LockStatus.NOT_LOCKABLE, LockStatus.NO_LOCK):
+            icon = 'NONE'
+        layout.label(text=f"{os.path.basename(path)}: {state.name.replace('_', ' ').lower()}", icon=icon)
 
 def sb_locks_top_bar_menu_draw(self: bpy.types.Menu, _context: bpy.types.Context) -> None:
     if ignore_file():
@@ -133,177 +163,858 @@ def sb_locks_top_bar_menu_draw(self: bpy.types.Menu, _context: bpy.types.Context
 
 
 
+class GitError(RuntimeError):
+    """A git command failed, the message contains what git printed"""
+
+
+def run_git(args: list[str], cwd: str, timeout: float = GIT_TIMEOUT_SEC) -> str:
+    """Runs git and returns its output. Safe to call from the worker threads."""
+    try:
+        result = subprocess.run(['git'] + args, cwd=cwd, capture_output=True, timeout=timeout,
+                                creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+    except subprocess.TimeoutExpired as ex:
+        raise TimeoutError(f"git {' '.join(args[:2])} didn't finish within {timeout} seconds") from ex
+    if result.returncode != 0:
+        message = result.stderr.decode("utf-8", errors="replace").strip()
+        raise GitError(f"git {' '.join(args[:2])} failed: {message}")
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def normalize_path(path: str) -> str:
+    """Key for paths relative to the repo root, the way git and LFS print them"""
+    path = path.replace('\\', '/')
+    return path.lower() if sys.platform == "win32" else path
+
+
+def parse_status(output: str) -> tuple[dict[str, str], list[str]]:
+    """Parses git status --porcelain=v2 -z into the XY code of each changed path
+    and the untracked folders, which are listed without their content"""
+    changed: dict[str, str] = {}
+    untracked_dirs: list[str] = []
+    entries = iter(output.split("\0"))
+    for entry in entries:
+        if entry.startswith("1 "):
+            fields = entry.split(" ", 8)
+            changed[normalize_path(fields[8])] = fields[1]
+        elif entry.startswith("2 "):
+            fields = entry.split(" ", 9)
+            changed[normalize_path(fields[9])] = fields[1]
+            changed[normalize_path(next(entries, ""))] = fields[1] # original path of the rename
+        elif entry.startswith("u "):
+            fields = entry.split(" ", 10)
+            changed[normalize_path(fields[10])] = fields[1]
+        elif entry.startswith("? "):
+            path = normalize_path(entry[2:])
+            if path.endswith("/"):
+                untracked_dirs.append(path)
+            else:
+                changed[path] = "??"
+    return changed, untracked_dirs
+
+
+class FileAttributes:
+    """What .gitattributes says about a file"""
+    __slots__ = ("lockable",)
+
+    def __init__(self, lockable: bool):
+        self.lockable = lockable
+
+
+class AttributeChecker:
+    """Keeps one git check-attr --stdin process per repo, so any number of paths can be
+    asked about without starting git for each. It's restarted when an attributes file which
+    applies to the checked paths changed, git reads each .gitattributes only once per process."""
+
+    def __init__(self, repo: "RepoContext"):
+        self.repo = repo
+        self.__lock = threading.Lock()
+        self.__process: subprocess.Popen = None
+        self.__signature: dict[str, bytes] = {}
+        """Attributes files the running process read to their content at the time"""
+        self.__fields: list[bytes] = []
+        """Answers read but not used yet"""
+        self.__partial = b""
+        """Start of an answer which didn't arrive completely"""
+        self.__global_file: str = None
+        """core.attributesFile, resolved once"""
+
+    def __global_attributes_file(self) -> str:
+        if self.__global_file is None:
+            try:
+                self.__global_file = run_git(['config', '--path', 'core.attributesFile'], self.repo.root).strip()
+            except GitError:
+                self.__global_file = "" # not set
+            if not self.__global_file:
+                config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+                self.__global_file = os.path.join(config_home, "git", "attributes")
+        return self.__global_file
+
+    @staticmethod
+    def __read(path: str) -> bytes:
+        try:
+            with open(path, "rb") as file:
+                return file.read()
+        except OSError:
+            return None
+
+    def signature(self, files: list[str]) -> dict[str, bytes]:
+        """Contents of every attributes file which applies to files: the .gitattributes in their
+        folders up to the root, info/attributes and core.attributesFile. Saves, staging and
+        commits which don't touch them keep the process running."""
+        folders = {""}
+        for file in files:
+            folder = posixpath.dirname(self.repo.git_path(file))
+            while folder not in folders:
+                folders.add(folder)
+                folder = posixpath.dirname(folder)
+        paths = [os.path.join(self.repo.root, i, ".gitattributes") for i in folders]
+        paths += [os.path.join(self.repo.git_dir, "info", "attributes"), self.__global_attributes_file()]
+        return {path: self.__read(path) for path in paths}
+
+    def __start(self) -> None:
+        self.__process = subprocess.Popen(
+            ['git', 'check-attr', '--stdin', '-z', 'lockable'], cwd=self.repo.root,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+        self.__fields = []
+        self.__partial = b""
+
+    def __read_fields(self, count: int) -> list[bytes]:
+        while len(self.__fields) < count:
+            data = self.__process.stdout.read1(65536)
+            if not data:
+                raise GitError(f"git check-attr exited with {self.__process.poll()}")
+            fields = (self.__partial + data).split(b"\0")
+            self.__partial = fields.pop()
+            self.__fields += fields
+        result = self.__fields[:count]
+        self.__fields = self.__fields[count:]
+        return result
+
+    def __query(self, paths: list[str]) -> list[FileAttributes]:
+        result = []
+        for start in range(0, len(paths), ATTR_CHUNK_SIZE):
+            chunk = paths[start:start + ATTR_CHUNK_SIZE]
+            self.__process.stdin.write(b"".join(i.encode("utf-8") + b"\0" for i in chunk))
+            self.__process.stdin.flush()
+            # path, attribute, value for each path
+            fields = self.__read_fields(len(chunk) * 3)
+            for i in range(0, len(fields), 3):
+                result.append(FileAttributes(fields[i + 2] == b"set"))
+        return result
+
+    def check(self, files: list[str]) -> dict[str, FileAttributes]:
+        """Attributes of each file, all in one go. Raises GitError if git check-attr doesn't work."""
+        if not files:
+            return {}
+        paths = [self.repo.git_path(i) for i in files]
+        with self.__lock:
+            signature = self.signature(files)
+            if any(self.__signature.get(path, content) != content for path, content in signature.items()):
+                self.close()
+                self.__signature = {}
+            # git reads the .gitattributes of folders it didn't visit yet when they're first needed
+            self.__signature.update(signature)
+            for retry in (False, True):
+                try:
+                    if self.__process is None or self.__process.poll() is not None:
+                        self.__start()
+                    return dict(zip(files, self.__query(paths)))
+                except (OSError, GitError):
+                    self.close()
+                    if retry:
+                        raise
+        return {}
+
+    def close(self) -> None:
+        if self.__process is None:
+            return
+        try:
+            self.__process.stdin.close()
+            self.__process.wait(GIT_TIMEOUT_SEC)
+        except (OSError, subprocess.TimeoutExpired):
+            self.__process.kill()
+        self.__process = None
+
+
+class LockInfo:
+    """One LFS lock as listed by git lfs locks"""
+    __slots__ = ("path", "id", "owner", "ours")
+
+    def __init__(self, data: dict, ours: bool):
+        self.path: str = data["path"]
+        """Relative to the repo root, as LFS prints it"""
+        self.id: str = data.get("id")
+        self.owner: str = data.get("owner", {}).get("name")
+        self.ours = ours
+
+
+class LockTable:
+    """All LFS locks of a repo from a single git lfs locks call, shared by every lock query.
+    Our own lock and unlock commands update it directly instead of asking the server again."""
+
+    TTL_SEC = CHECK_INTERVAL_SEC
+
+    def __init__(self, root: str):
+        self.root = root
+        self.__lock = threading.Lock()
+        self.locks: dict[str, LockInfo] = {}
+        """Normalized path relative to the root to its lock"""
+        self.fetched: float = None
+        """time.monotonic() of the last server query, None if it never succeeded"""
+
+    def refresh(self, max_age: float = TTL_SEC) -> None:
+        """Asks the server unless the table is younger than max_age"""
+        with self.__lock:
+            if self.fetched is not None and time.monotonic() - self.fetched < max_age:
+                return
+            started = time.monotonic()
+            result = json.loads(run_git(['lfs', 'locks', '--json', '--verify'], self.root, LFS_TIMEOUT_SEC))
+            locks = {}
+            for ours, key in ((True, 'ours'), (False, 'theirs')):
+                for data in result.get(key) or []:
+                    lock = LockInfo(data, ours)
+                    locks[normalize_path(lock.path)] = lock
+            self.locks = locks
+            self.fetched = started
+
+    def get(self, path: str) -> LockInfo:
+        """Lock of a path relative to the root, without asking the server"""
+        return self.locks.get(normalize_path(path))
+
+    def ours(self) -> list[LockInfo]:
+        return [i for i in self.locks.values() if i.ours]
+
+    def locked(self, data: dict) -> None:
+        """We got the lock, data is what git lfs lock --json printed"""
+        lock = LockInfo(data, True)
+        with self.__lock:
+            self.locks = {**self.locks, normalize_path(lock.path): lock}
+
+    def unlocked(self, path: str) -> None:
+        with self.__lock:
+            self.locks = {key: value for key, value in self.locks.items() if key != normalize_path(path)}
+
+
+class RepoContext:
+    """What the add-on knows about one repository. The root is resolved once and
+    git status is only run again after the index or HEAD changed, or when a file
+    asked about was modified after the last status."""
+
+    def __init__(self, root: str, git_dir: str):
+        self.root = root
+        self.git_dir = git_dir
+        self.__lock = threading.Lock()
+        self.__signature: tuple = None
+        self.__status_time_ns = 0
+        """When the last git status started"""
+        self.changed: dict[str, str] = {}
+        """Normalized path relative to the root to its XY status code"""
+        self.untracked_dirs: list[str] = []
+        self.locks = LockTable(root)
+        self.attributes = AttributeChecker(self)
+        self.__upstream_lock = threading.Lock()
+        self.__upstream: tuple[float, str] = None
+        """When ls-remote ran and the commit the upstream branch pointed to, None if there is no upstream"""
+
+    def relative(self, file: str) -> str:
+        return normalize_path(os.path.relpath(file, self.root))
+
+    def git_path(self, file: str) -> str:
+        """Relative path to pass to git, unlike relative() it keeps the case"""
+        return os.path.relpath(file, self.root).replace('\\', '/')
+
+    def absolute(self, path: str) -> str:
+        return os.path.normpath(os.path.join(self.root, path))
+
+    def __stat(self, path: str) -> tuple[int, int]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def read_head(self) -> str:
+        """Content of HEAD, "ref: refs/heads/<branch>" unless it's detached"""
+        try:
+            with open(os.path.join(self.git_dir, "HEAD"), encoding="utf-8") as head_file:
+                return head_file.read().strip()
+        except OSError:
+            return ""
+
+    def metadata_signature(self) -> tuple:
+        """Changes whenever the index, HEAD or the branch HEAD points to changes"""
+        head = self.read_head()
+        ref = head[5:].strip() if head.startswith("ref:") else None
+        return (
+            self.__stat(os.path.join(self.git_dir, "index")),
+            head,
+            self.__stat(os.path.join(self.git_dir, ref)) if ref else None,
+            self.__stat(os.path.join(self.git_dir, "packed-refs")),
+        )
+
+    def refresh(self, force: bool = False) -> None:
+        with self.__lock:
+            signature = self.metadata_signature()
+            if not force and signature == self.__signature:
+                return
+            status_time_ns = time.time_ns()
+            output = run_git(['status', '--porcelain=v2', '-z'], self.root)
+            self.changed, self.untracked_dirs = parse_status(output)
+            self.__signature = signature
+            self.__status_time_ns = status_time_ns
+
+    def status_code(self, file: str) -> str:
+        """XY code of git status for the file, None if it's unchanged"""
+        # saving only touches the work tree, not the index
+        modified = self.__stat(file)
+        self.refresh(modified is not None and self.__status_time_ns <= modified[0])
+        path = self.relative(file)
+        code = self.changed.get(path)
+        if code is None and any(path.startswith(i) for i in self.untracked_dirs):
+            return "??"
+        return code
+
+    def is_changed(self, file: str) -> bool:
+        return self.status_code(file) is not None
+
+    def upstream_commit(self, max_age: float = UPSTREAM_TTL_SEC) -> str:
+        """Commit the upstream of the current branch points to on the remote, None without upstream.
+        Only that one ref is asked for with ls-remote, nothing gets fetched."""
+        with self.__upstream_lock:
+            if self.__upstream is not None and time.monotonic() - self.__upstream[0] < max_age:
+                return self.__upstream[1]
+            started = time.monotonic()
+            commit = None
+            head = self.read_head()
+            if head.startswith("ref:"):
+                upstream = run_git(['for-each-ref', '--format=%(upstream:remotename)%00%(upstream:remoteref)',
+                                    head[4:].strip()], self.root).strip()
+                remote, _, ref = upstream.partition("\0")
+                if remote and ref:
+                    output = run_git(['ls-remote', remote, ref], self.root, LFS_TIMEOUT_SEC)
+                    for line in output.splitlines():
+                        sha, _, name = line.partition("\t")
+                        if name == ref:
+                            commit = sha
+            self.__upstream = (started, commit)
+            return commit
+
+
+REPOS: dict[str, RepoContext] = {}
+"""Git root to its context"""
+REPO_FOLDERS: dict[str, RepoContext] = {}
+"""Folders files were looked up from to the context of the repo they're in"""
+REPOS_LOCK = threading.Lock()
+
+def get_repo(file: str) -> RepoContext:
+    """Raises GitError if the file isn't in a repo"""
+    folder = os.path.dirname(os.path.abspath(file))
+    with REPOS_LOCK:
+        repo = REPO_FOLDERS.get(folder)
+    if repo is not None:
+        return repo
+    root, git_dir = run_git(['rev-parse', '--show-toplevel', '--absolute-git-dir'], folder).splitlines()[:2]
+    root = os.path.normpath(root)
+    with REPOS_LOCK:
+        repo = REPOS.setdefault(root, RepoContext(root, os.path.normpath(git_dir)))
+        REPO_FOLDERS[folder] = repo
+    return repo
+
+def close_repos() -> None:
+    with REPOS_LOCK:
+        for repo in REPOS.values():
+            repo.attributes.close()
+
+
 def git_status(file: str) -> GitStatus:
-    result = subprocess.check_output(['git', 'status', '--porcelain=v1', file], cwd=get_git_root(file))
-    if len(result) == 0:
+    code = get_repo(file).status_code(file)
+    if code is None:
         return GitStatus.UNCHANGED
-    result = result.decode(sys.stdout.encoding)
-    if result[1] == 'M':
+    if code[1] == 'M':
         return GitStatus.CHANGED
     return GitStatus.UNKNOWN
 
 def is_up_to_date(file: str) -> bool:
-    # branch = subprocess.check_output(['git' 'rev-parse' '--abbrev-ref' 'HEAD'], cwd=os.path.dirname(file))
-    # branch = result.decode(sys.stdout.encoding)
-    # subprocess.check_output(['git', 'remote', 'update'], cwd=os.path.dirname(file))
-    subprocess.check_output(['git', 'fetch'], cwd=get_git_root(file))
-
-    # bogus path so no files are returned, only how many commits remote is ahead
-    result = subprocess.check_output(['git', 'status', '-sb', '-uno', '.asdsdasd'], cwd=get_git_root(file))
-    result = result.decode(sys.stdout.encoding)
-    return result.find("behind") == -1
-
-def run_lfs_command(command: str, file: str) -> None:
-    command_array = ['git', 'lfs', command, '--json', file]
+    """True if HEAD contains the commit the upstream branch is at on the remote, or there is no upstream.
+    Uses the cached upstream commit, the status checks keep it fresh in the background."""
+    repo = get_repo(file)
+    commit = repo.upstream_commit()
+    if commit is None:
+        return True
+    try:
+        # fails as well if the commit wasn't fetched yet
+        run_git(['merge-base', '--is-ancestor', commit, 'HEAD'], repo.root)
+    except GitError:
+        return False
+    return True
+
+def run_lfs_command(command: str, file: str) -> bool:
+    """Failures are only printed, returns whether it worked. Timeouts are raised.
+    The lock table of the repo is updated with the result."""
+    repo = get_repo(file)
     try:
-        subprocess.check_output(command_array, cwd=get_git_root(file))
-    except Exception as e:
+        output = run_git(['lfs', command, '--json', file], repo.root, LFS_TIMEOUT_SEC)
+    except GitError as e:
         print(f"{e}")
+        return False
+    if command == 'lock':
+        try:
+            repo.locks.locked(json.loads(output))
+        except (ValueError, KeyError, TypeError):
+            repo.locks.refresh(0) # unexpected output, ask the server what happened
+    elif command == 'unlock':
+        repo.locks.unlocked(repo.relative(file))
+    return True
 
 
-def get_locks_to_free(file: str) -> list[str]:
-    file = file.replace('\\', '/')
-    result = subprocess.check_output(['git', 'lfs', 'locks', '--json', '--verify', file], cwd=get_git_root(file))
-    result = json.loads(result)
+def unlock_files(files: list[str], progress) -> dict[str, str]:
+    """Unlocks the files of one repo with as few LFS calls as possible, several at the same time.
+    Returns the files which are still locked and why."""
+    if not files:
+        return {}
+    repo = get_repo(files[0])
+    paths = [repo.git_path(i) for i in files]
+    batches = [paths[i:i + UNLOCK_BATCH_SIZE] for i in range(0, len(paths), UNLOCK_BATCH_SIZE)]
+    errors: dict[str, str] = {}
+    """First error of each path"""
+
+    def unlock(batch: list[str]) -> None:
+        try:
+            run_git(['lfs', 'unlock', '--json'] + batch, repo.root, LFS_TIMEOUT_SEC)
+        except (GitError, TimeoutError) as ex:
+            for path in batch:
+                errors[path] = str(ex)
+
+    def run_all(batches: list[list[str]], text: str) -> None:
+        done = 0
+        with concurrent.futures.ThreadPoolExecutor(UNLOCK_WORKERS) as pool:
+            for future in concurrent.futures.as_completed([pool.submit(unlock, i) for i in batches]):
+                future.result()
+                done += 1
+                progress(f"{text} {done}/{len(batches)}...")
+
+    run_all(batches, "Unlocking batch" if len(batches) != 1 else "Unlocking")
+    # one query tells which paths are still locked, no matter how the batches went
+    repo.locks.refresh(0)
+    remaining = [i for i in paths if (lock := repo.locks.get(i)) is not None and lock.ours]
+    if remaining and 1 < len(paths):
+        # retry one by one, older LFS versions only unlock one path per call and it tells us why each failed
+        errors.clear()
+        run_all([[i] for i in remaining], "Retrying file")
+        repo.locks.refresh(0)
+        remaining = [i for i in remaining if (lock := repo.locks.get(i)) is not None and lock.ours]
+    return {repo.absolute(i): errors.get(i, "still locked") for i in remaining}
 
-    status = subprocess.check_output(['git', 'status', '--porcelain=v1'], cwd=get_git_root(file))
-    status = status.decode(sys.stdout.encoding)
 
+def get_locks_to_free(file: str) -> list[str]:
+    repo = get_repo(file)
+    # the table might be a few seconds old, this should see every lock we hold
+    repo.locks.refresh(0)
+
+    locked = [repo.absolute(i.path) for i in repo.locks.ours()]
+    attributes = repo.attributes.check(locked)
     ours = []
-    for i in result['ours']:
-        path = i['path']
-        if path.find(".blend") == -1:
+    for full_path in locked:
+        if not attributes[full_path].lockable:
             continue
         # make sure the file doesn't show up in git status as changed/staged
-        if status.find(path) == -1:
-            ours.append(os.path.join(get_git_root(file), path))
+        if not repo.is_changed(full_path):
+            ours.append(full_path)
     return ours
 
 
 
-def update_lock_status(file: str) -> None:
-    global CURRENT_STATE
+def compute_lock_status(file: str, attributes: FileAttributes = None) -> LockStatus:
+    """Asks git and the LFS server, this blocks. Safe to call from the worker threads.
+    Pass the attributes if they were already checked together with other files."""
     if not os.path.exists(file):
-        CURRENT_STATE = LockStatus.NOT_TRACKED
-        return
+        return LockStatus.NOT_TRACKED
 
     try:
+        repo = get_repo(file)
         git_status(file)
-    except:
+    except Exception:
         # don't run without git repo
-        CURRENT_STATE = LockStatus.NOT_TRACKED
-        return
-
-    file = file.replace('\\', '/')
-    result = subprocess.check_output(['git', 'lfs', 'locks', '--json', '--verify', file], cwd=get_git_root(file))
-    result = json.loads(result)
+        return LockStatus.NOT_TRACKED
 
-    theirs = []
-    for i in result['theirs']:
-        path = i['path']
-        if file.find(path) != -1:
-            theirs.append(i)
+    if attributes is None:
+        attributes = repo.attributes.check([file])[file]
+    if not attributes.lockable:
+        return LockStatus.NOT_LOCKABLE
 
-    ours = []
-    for i in result['ours']:
-        path = i['path']
-        if file.find(path) != -1:
-            ours.append(i)
-    
-    if 0 < len(theirs):
+    repo.locks.refresh()
+    lock = repo.locks.get(repo.relative(file))
+    if lock is not None and not lock.ours:
         if not os.access(file, os.W_OK):
-            CURRENT_STATE = LockStatus.LOCKED_BY_OTHER
-            return
+            return LockStatus.LOCKED_BY_OTHER
         print("File is not readonly, but some else owns the lock, something is wrong...")
-        CURRENT_STATE = LockStatus.INVALID
-        return
-    if 0 < len(ours):
+        return LockStatus.INVALID
+    if lock is not None:
         if os.access(file, os.W_OK):
-            CURRENT_STATE = LockStatus.LOCKED_BY_US
-            return
+            return LockStatus.LOCKED_BY_US
         print("We hold the lock but can't edit the file, something is wrong...")
+        return LockStatus.INVALID
+    return LockStatus.NO_LOCK
+
+
+def compute_lock_states(file: str, libraries: list[str], refresh_locks: bool = False
+                        ) -> tuple[LockStatus, dict[str, LockStatus]]:
+    """Status of the file and the linked libraries, they share the lock table so
+    libraries in the same repo don't cost another server query"""
+    if refresh_locks:
+        try:
+            get_repo(file).locks.refresh(0)
+        except Exception as ex:
+            print(f"LFS lock query failed: {ex}")
+    try:
+        # keeps the upstream commit fresh so the lock button doesn't have to wait for the remote
+        get_repo(file).upstream_commit()
+    except Exception as ex:
+        print(f"LFS upstream check failed: {ex}")
+    # one check-attr round trip for all libraries of a repo
+    by_repo: dict[RepoContext, list[str]] = {}
+    for library in libraries:
+        try:
+            by_repo.setdefault(get_repo(library), []).append(library)
+        except Exception:
+            pass # not in a repo
+    attributes: dict[str, FileAttributes] = {}
+    for repo, files in by_repo.items():
+        try:
+            attributes.update(repo.attributes.check(files))
+        except Exception as ex:
+            print(f"LFS attribute check failed: {ex}")
+    states = {}
+    for library in libraries:
+        try:
+            states[library] = compute_lock_status(library, attributes.get(library))
+        except Exception as ex:
+            print(f"LFS status check of {library} failed: {ex}")
+            states[library] = LockStatus.INVALID
+    return compute_lock_status(file), states
+
+
+def get_library_paths() -> list[str]:
+    return [os.path.normpath(bpy.path.abspath(i.filepath)) for i in bpy.data.libraries]
+
+
+def update_lock_status(file: str) -> None:
+    """Blocking version of request_lock_status"""
+    global CURRENT_STATE, LIBRARY_STATES
+    CURRENT_STATE, LIBRARY_STATES = compute_lock_states(file, get_library_paths())
+
+
+class GitJobs:
+    """Runs git and LFS commands in worker threads so the UI never waits for them.
+    Callbacks get the finished future on the main thread, from a timer."""
+
+    WORKERS = 2
+
+    def __init__(self):
+        self.executor: concurrent.futures.ThreadPoolExecutor = None
+        self.pending: list[tuple[concurrent.futures.Future, object]] = []
+
+    def submit(self, function, callback=None) -> concurrent.futures.Future:
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.WORKERS, "SB LFS")
+        future = self.executor.submit(function)
+        self.pending.append((future, callback))
+        if not bpy.app.timers.is_registered(poll_git_jobs):
+            bpy.app.timers.register(poll_git_jobs, first_interval=JOB_POLL_SEC)
+        return future
+
+    def poll(self) -> float:
+        done = []
+        pending = []
+        for job in self.pending:
+            (done if job[0].done() else pending).append(job)
+        self.pending = pending
+        for future, callback in done:
+            if callback is None:
+                continue
+            try:
+                callback(future)
+            except Exception as ex:
+                print(f"LFS job callback failed: {ex}")
+        return JOB_POLL_SEC if self.pending else None
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.pending = []
+        if bpy.app.timers.is_registered(poll_git_jobs):
+            bpy.app.timers.unregister(poll_git_jobs)
+
+JOBS = GitJobs()
+
+@persistent
+def poll_git_jobs() -> float:
+    return JOBS.poll()
+
+
+def redraw_top_bar() -> None:
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'TOPBAR':
+                area.tag_redraw()
+
+
+STATUS_JOB: tuple[str, concurrent.futures.Future, bool] = None
+"""File the running status check is for, its future and whether it asks the server for sure"""
+
+def request_lock_status(file: str, refresh_locks: bool = False) -> None:
+    """Checks the lock status in the background, the top bar keeps showing the last state until it's done.
+    refresh_locks asks the LFS server even if the lock table is recent."""
+    global STATUS_JOB
+    if (STATUS_JOB is not None and STATUS_JOB[0] == file and not STATUS_JOB[1].done()
+            and (STATUS_JOB[2] or not refresh_locks)):
+        return
+    libraries = get_library_paths()
+    future = JOBS.submit(lambda: compute_lock_states(file, libraries, refresh_locks), apply_lock_status)
+    STATUS_JOB = (file, future, refresh_locks)
+
+def apply_lock_status(future: concurrent.futures.Future) -> None:
+    global CURRENT_STATE, LIBRARY_STATES
+    if STATUS_JOB is None or STATUS_JOB[1] is not future or STATUS_JOB[0] != bpy.data.filepath:
+        return # another file got opened in the meantime
+    try:
+        CURRENT_STATE, LIBRARY_STATES = future.result()
+    except Exception as ex:
+        print(f"LFS status check failed: {ex}")
         CURRENT_STATE = LockStatus.INVALID
+    redraw_top_bar()
+
+
+WATCHED_FILE: str = None
+WATCHED: list[stuntboost_bpl.WatchSubscription] = []
+"""The open file and the git metadata of its repo, watched by the BPL loader"""
+WRITABLE: dict[str, bool] = {}
+"""Normalized path of each watched file to whether it was writable when last seen"""
+
+def get_watch_paths(file: str) -> list[str]:
+    """Files which change on commits, checkouts, pulls and fetches. Runs in the worker."""
+    repo = get_repo(file)
+    paths = [file] + [os.path.join(repo.git_dir, i) for i in ("index", "HEAD", "packed-refs")]
+    head = repo.read_head()
+    if head.startswith("ref:"):
+        ref = head[4:].strip()
+        paths.append(os.path.join(repo.git_dir, ref))
+        upstream = run_git(['for-each-ref', '--format=%(upstream)', ref], repo.root).strip()
+        if upstream:
+            paths.append(os.path.join(repo.git_dir, upstream))
+    return paths
+
+def is_writable(file: str) -> bool:
+    """From the mode bits, git lfs makes lockable files read only while we don't hold the lock"""
+    try:
+        return bool(os.stat(file).st_mode & stat.S_IWUSR)
+    except OSError:
+        return None
+
+def unwatch_file() -> None:
+    global WATCHED_FILE
+    for subscription in WATCHED:
+        stuntboost_bpl.unsubscribe(subscription)
+    WATCHED.clear()
+    WRITABLE.clear()
+    WATCHED_FILE = None
+
+def watch_file(file: str) -> None:
+    """Checks the lock status whenever git metadata of the repo or the file itself change.
+    LFS flips the write permission of the file on lock and unlock."""
+    global WATCHED_FILE
+    unwatch_file()
+    WATCHED_FILE = file
+    if file:
+        WRITABLE[os.path.normcase(os.path.abspath(file))] = is_writable(file)
+        JOBS.submit(lambda: get_watch_paths(file), lambda future: subscribe_watch_paths(file, future))
+
+def subscribe_watch_paths(file: str, future: concurrent.futures.Future) -> None:
+    if file != WATCHED_FILE:
         return
-    CURRENT_STATE = LockStatus.NO_LOCK
+    try:
+        paths = future.result()
+    except Exception:
+        return # not in a repo, nothing to watch
+    for path in paths:
+        WATCHED.append(stuntboost_bpl.subscribe(path, on_watched_change))
+
+def on_watched_change(path: str) -> None:
+    file = bpy.data.filepath
+    if not file:
+        return
+    refresh_locks = False
+    if path in WRITABLE:
+        # a changed permission means someone locked or unlocked it locally, maybe with another git client.
+        # Saving changes the file too, that doesn't need asking the server
+        writable = is_writable(path)
+        refresh_locks = writable != WRITABLE[path]
+        WRITABLE[path] = writable
+    if os.path.basename(path) == "HEAD":
+        watch_file(file) # the branch might have changed
+    request_lock_status(file, refresh_locks=refresh_locks)
+
+
+class LfsJob:
+    """Work of an operator running in the git worker, with a progress text the UI can show"""
+
+    def __init__(self, title: str):
+        self.progress = title
+        self.future: concurrent.futures.Future = None
+
+    def set_progress(self, text: str) -> None:
+        self.progress = text
+
+
+class LfsJobOperator:
+    """Runs work(file, progress) in the git worker while Blender stays responsive and shows the progress
+    in the status bar. execute still blocks, for scripts and background mode."""
+
+    show_message_box = False
+
+    def prepare(self) -> str:
+        """Checks on the main thread, returns the file to work on or None if there is nothing to do"""
+        if not bpy.data.filepath:
+            return None # new unsaved file
+        return bpy.data.filepath
+
+    def work(self, file: str, progress) -> tuple[LockStatus, str]:
+        """Runs in the worker, returns the lock status of the file afterwards and a message.
+        Operators override this, by default it only checks the status.
+        Not an abc.abstractmethod, ABCMeta doesn't mix with the metaclass of bpy.types.Operator."""
+        progress("Checking lock status...")
+        return compute_lock_status(file), "Lock status updated"
+
+    def finish(self, file: str, get_result) -> set[str]:
+        global CURRENT_STATE
+        try:
+            state, message = get_result()
+        except Exception as ex:
+            self.report({'ERROR'}, str(ex))
+            request_lock_status(file)
+            return {'CANCELLED'}
+        if file == bpy.data.filepath:
+            CURRENT_STATE = state
+            redraw_top_bar()
+        print(message)
+        if self.show_message_box:
+            message_box(message)
+        else:
+            self.report({'INFO'}, message)
+        return {'FINISHED'}
+
+    def execute(self, _context: bpy.types.Context):
+        file = self.prepare()
+        if file is None:
+            return {'FINISHED'}
+        return self.finish(file, lambda: self.work(file, print))
+
+    def invoke(self, context: bpy.types.Context, _event):
+        file = self.prepare()
+        if file is None:
+            return {'FINISHED'}
+        self._file = file
+        self._job = LfsJob(self.bl_label)
+        job = self._job
+        job.future = JOBS.submit(lambda: self.work(file, job.set_progress))
+        self._timer = context.window_manager.event_timer_add(JOB_POLL_SEC, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context: bpy.types.Context, event):
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if not self._job.future.done():
+            context.workspace.status_text_set(self._job.progress)
+            return {'RUNNING_MODAL'}
+        context.window_manager.event_timer_remove(self._timer)
+        context.workspace.status_text_set(None)
+        return self.finish(self._file, self._job.future.result)
 
 
-class SB_LockLfsFile(bpy.types.Operator):
+class SB_LockLfsFile(LfsJobOperator, bpy.types.Operator):
     """Tries to acquire the git LFS lock for the current file"""
     bl_idname = SB_LOCK_OPERATOR
     bl_label = "Lock the current file in git LFS"
     bpl_auto_load = True
 
-    def execute(self, _context: bpy.types.Context):
-        if not bpy.data.filepath:
-            return {'FINISHED'} # new unsaved file
+    def prepare(self) -> str:
         if ignore_file():
-            raise Exception("We don't allow locking export files since they aren't in the repo.")
-        if not is_up_to_date(bpy.data.filepath):
+            raise Exception("The file isn't marked lockable in .gitattributes, export files don't need a lock.")
+        return super().prepare()
+
+    def work(self, file: str, progress) -> tuple[LockStatus, str]:
+        if not get_repo(file).attributes.check([file])[file].lockable:
+            raise Exception("The file isn't marked lockable in .gitattributes, export files don't need a lock.")
+        progress("Checking if the repo is up to date...")
+        if not is_up_to_date(file):
             raise Exception("Repo not up to date, run git pull first.")
-        run_lfs_command('lock', bpy.data.filepath)
-        update_lock_status(bpy.data.filepath)
-        if CURRENT_STATE == LockStatus.LOCKED_BY_US:
-            return {'FINISHED'}
-        if CURRENT_STATE == LockStatus.LOCKED_BY_OTHER:
+        progress("Locking...")
+        if not run_lfs_command('lock', file):
+            get_repo(file).locks.refresh(0) # find out if someone else has it
+        state = compute_lock_status(file)
+        if state == LockStatus.LOCKED_BY_US:
+            return state, "File locked"
+        if state == LockStatus.LOCKED_BY_OTHER:
             raise Exception("File already locked.")
-        if CURRENT_STATE == LockStatus.NO_LOCK:
-            raise Exception("Failed to acquire lock.")
-        if CURRENT_STATE == LockStatus.INVALID:
-            raise Exception("Failed to acquire lock.")
-        return {'FINISHED'}
+        raise Exception("Failed to acquire lock.")
 
 
-class SB_UnlockLfsFile(bpy.types.Operator):
+class SB_UnlockLfsFile(LfsJobOperator, bpy.types.Operator):
     """Releases the git LFS lock for the current file"""
     bl_idname = SB_UNLOCK_OPERATOR
     bl_label = "Unlock the current file in git LFS"
     bpl_auto_load = True
 
-    def execute(self, _context: bpy.types.Context):
-        if not bpy.data.filepath:
-            return {'FINISHED'} # new unsaved file
-        status = git_status(bpy.data.filepath)
+    def work(self, file: str, progress) -> tuple[LockStatus, str]:
+        progress("Checking for changes...")
+        status = git_status(file)
         if status != GitStatus.UNCHANGED:
             raise Exception("File is not unchanged, commit and push before releasing lock.")
-        run_lfs_command('unlock', bpy.data.filepath)
-        update_lock_status(bpy.data.filepath)
-        if CURRENT_STATE == LockStatus.NO_LOCK:
-            return {'FINISHED'}
-        if CURRENT_STATE == LockStatus.LOCKED_BY_OTHER:
+        progress("Unlocking...")
+        run_lfs_command('unlock', file)
+        state = compute_lock_status(file)
+        if state == LockStatus.NO_LOCK:
+            return state, "File unlocked"
+        if state == LockStatus.LOCKED_BY_OTHER:
             raise Exception("File already locked.")
-        if CURRENT_STATE == LockStatus.LOCKED_BY_US:
+        if state == LockStatus.LOCKED_BY_US:
             raise Exception("Failed to release lock.")
-        if CURRENT_STATE == LockStatus.INVALID:
-            raise Exception("Failed to release lock. unknown status")
-        return {'FINISHED'}
+        raise Exception("Failed to release lock. unknown status")
 
-class SB_UnlockAllLfsFiles(bpy.types.Operator):
+class SB_UnlockAllLfsFiles(LfsJobOperator, bpy.types.Operator):
     """Releases the git LFS lock on all files"""
     bl_idname = SB_UNLOCK_ALL_OPERATOR
     bl_label = "Unlock all files in git LFS"
     bpl_auto_load = True
+    show_message_box = True
 
-    def execute(self, _context: bpy.types.Context):
-        if not bpy.data.filepath:
-            return {'FINISHED'} # new unsaved file
-        if not is_up_to_date(bpy.data.filepath):
+    def work(self, file: str, progress) -> tuple[LockStatus, str]:
+        progress("Checking if the repo is up to date...")
+        if not is_up_to_date(file):
             raise Exception("Repo not up to date, run git pull first.")
-        locked = get_locks_to_free(bpy.data.filepath)
+        progress("Looking for locks...")
+        locked = get_locks_to_free(file)
+        failed = unlock_files(locked, progress)
         for i in locked:
-            run_lfs_command('unlock', i)
-            print(f"Unlocked {i}")
-        update_lock_status(bpy.data.filepath)
-        msg = f"Done unlocking {len(locked)} file(s)"
-        message_box(msg)
-        print(msg)
-        return {'FINISHED'}
+            if i not in failed:
+                print(f"Unlocked {i}")
+        message = f"Done unlocking {len(locked) - len(failed)} file(s)"
+        if failed:
+            message += f", {len(failed)} failed:"
+            for path, reason in sorted(failed.items()):
+                message += f"\n{os.path.relpath(path, get_git_root(file))}: {reason}"
+        return compute_lock_status(file), message
 
 
 class SB_FileLocking:
     @staticmethod
     @persistent
     def load_post_handler(blend_path: str) -> None:
-        update_lock_status(blend_path)
+        watch_file(blend_path)
+        request_lock_status(blend_path)
 
 
     @staticmethod
@@ -311,7 +1022,9 @@ class SB_FileLocking:
     def poll_file_locked():
         if not bpy.data.filepath:
             return CHECK_INTERVAL_SEC # new unsaved file
-        SB_FileLocking.load_post_handler(bpy.data.filepath)
+        if WATCHED_FILE != bpy.data.filepath:
+            watch_file(bpy.data.filepath)
+        request_lock_status(bpy.data.filepath)
         return CHECK_INTERVAL_SEC
 
 
@@ -322,7 +1035,7 @@ class SB_FileLocking:
         bpy.app.handlers.load_post.append(SB_FileLocking.load_post_handler)
         bpy.app.timers.register(
             function=SB_FileLocking.poll_file_locked,
-            first_interval=CHECK_INTERVAL_SEC, persistent=True)
+            first_interval=1, persistent=True)
         
         bpy.types.TOPBAR_MT_editor_menus.append(sb_locks_top_bar_menu_draw)
 
@@ -332,5 +1045,8 @@ class SB_FileLocking:
             return
         bpy.app.handlers.load_post.remove(SB_FileLocking.load_post_handler)
         bpy.app.timers.unregister(SB_FileLocking.poll_file_locked)
+        unwatch_file()
+        JOBS.shutdown()
+        close_repos()
         
         bpy.types.TOPBAR_MT_editor_menus.remove(sb_locks_top_bar_menu_draw)
@@ -1,18 +1,36 @@
 # TODO report reloads and errors in the UI
 # TODO no restart when repo path is set
 # TODO gather all paths first
-# TODO manage deps properly https://www.indelible.org/ink/python-reloading/
 # move out the debugger starter into sub plugin
 # Auto self replace from repo version?
 
 import sys
 import os
+import ast
 import inspect
 import importlib
+import importlib.abc
+import importlib.machinery
 import importlib.util
 import pathlib
-import glob
 import types
+import time
+import collections
+import functools
+import hashlib
+import marshal
+import math
+import json
+import threading
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import concurrent.futures
+import gc
+import weakref
+import tracemalloc
 
 # pylint: disable=import-error
 import bpy
@@ -36,13 +54,1195 @@ BPL_UNLOAD_FUNC = "bpl_unload"
 BPL_AUTO_LOAD_PROP = "bpl_auto_load"
 """If a class has this property set to true, it will be registered to blender"""
 
+BPL_IGNORE_FILE = ".bplignore"
+"""Folders containing this file are skipped, including all sub folders"""
+
+
+class ScanDiff:
+    """Files which were added, removed or modified since the previous scan"""
+
+    def __init__(self):
+        self.added: list[str] = []
+        self.removed: list[str] = []
+        self.modified: list[str] = []
+        self.time = time.monotonic()
+        """When the changes were seen"""
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+
+class CachedDir:
+    """State of a single directory as seen by the last scan"""
+    __slots__ = ("mtime", "inode", "ignored", "subdirs", "files")
+
+    def __init__(self, mtime: int, inode: tuple[int, int], ignored: bool):
+        self.mtime = mtime
+        self.inode = inode
+        """Device and inode, symlinked folders are followed but every folder is only scanned once"""
+        self.ignored = ignored
+        """Contains a .bplignore, still cached so we notice when it gets removed"""
+        self.subdirs: list[str] = []
+        self.files: dict[str, int] = {}
+        """File name to modification time in ns, only .py files"""
+
+
+class DirectoryScanner:
+    """Keeps a cached tree of the folder and only re-lists directories whose mtime changed.
+    Ignored sub trees are skipped while walking instead of being filtered afterwards.
+    Symlinked folders are followed like glob did, links back into the tree are skipped."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.dirs: dict[str, CachedDir] = {}
+        self.inodes: dict[tuple[int, int], str] = {}
+        """Device and inode of each cached directory to its path"""
+        self.stat_calls = 0
+        """Number of stat calls the last scan made"""
+
+    def __stat(self, path: str) -> os.stat_result:
+        self.stat_calls += 1
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    def __drop(self, path: str, diff: ScanDiff) -> None:
+        cached = self.dirs.pop(path, None)
+        if cached is None:
+            return
+        if self.inodes.get(cached.inode) == path:
+            del self.inodes[cached.inode]
+        diff.removed.extend(os.path.join(path, i) for i in cached.files)
+        for i in cached.subdirs:
+            self.__drop(i, diff)
+
+    def __relist(self, path: str, st: os.stat_result, diff: ScanDiff) -> set[str]:
+        """Updates the cached entries of a directory, returns the names of files it had to stat"""
+        old = self.dirs.get(path)
+        try:
+            entries = sorted(os.scandir(path), key=lambda i: i.name)
+        except OSError:
+            self.__drop(path, diff)
+            return set()
+
+        ignored = any(i.name == BPL_IGNORE_FILE for i in entries)
+        cached = CachedDir(st.st_mtime_ns, (st.st_dev, st.st_ino), ignored)
+        self.dirs[path] = cached
+        if old is not None and self.inodes.get(old.inode) == path:
+            del self.inodes[old.inode]
+        self.inodes[cached.inode] = path
+        if ignored:
+            if old is not None:
+                for i in old.subdirs:
+                    self.__drop(i, diff)
+                diff.removed.extend(os.path.join(path, i) for i in old.files)
+            return set()
+
+        fresh = set()
+        for entry in entries:
+            # like glob, skip hidden files and folders
+            if entry.name.startswith(".") or entry.name == "__pycache__":
+                continue
+            if entry.is_dir():
+                cached.subdirs.append(entry.path)
+            elif entry.name.endswith(".py"):
+                if old is not None and entry.name in old.files:
+                    cached.files[entry.name] = old.files[entry.name]
+                    continue
+                self.stat_calls += 1
+                try:
+                    cached.files[entry.name] = entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+                fresh.add(entry.name)
+                diff.added.append(entry.path)
+        if old is not None:
+            diff.removed.extend(os.path.join(path, i) for i in old.files if i not in cached.files)
+            for i in old.subdirs:
+                if i not in cached.subdirs:
+                    self.__drop(i, diff)
+        return fresh
+
+    def __check_files(self, path: str, cached: CachedDir, skip: set[str], diff: ScanDiff) -> None:
+        for name, mtime in list(cached.files.items()):
+            if name in skip:
+                continue
+            full_path = os.path.join(path, name)
+            st = self.__stat(full_path)
+            if st is None:
+                del cached.files[name]
+                diff.removed.append(full_path)
+            elif st.st_mtime_ns != mtime:
+                cached.files[name] = st.st_mtime_ns
+                diff.modified.append(full_path)
+
+    def __scan_dir(self, path: str, diff: ScanDiff, full: bool) -> None:
+        """full checks every cached file and sub folder, otherwise only this directory is re-listed"""
+        st = self.__stat(path)
+        if st is None:
+            self.__drop(path, diff)
+            return
+        inode = (st.st_dev, st.st_ino)
+        owner = self.inodes.get(inode)
+        if owner is not None and owner != path and owner in self.dirs and self.dirs[owner].inode == inode:
+            # a symlink to a folder which is already scanned, maybe one of its parents
+            self.__drop(path, diff)
+            return
+        cached = self.dirs.get(path)
+        fresh = set()
+        known_subdirs = set() if cached is None else set(cached.subdirs)
+        if cached is None or not full or cached.mtime != st.st_mtime_ns:
+            fresh = self.__relist(path, st, diff)
+            cached = self.dirs.get(path)
+            if cached is None:
+                return
+        if cached.ignored:
+            return
+        if full:
+            self.__check_files(path, cached, fresh, diff)
+        for i in cached.subdirs:
+            if full or i not in known_subdirs:
+                self.__scan_dir(i, diff, full)
+
+    def __scan_file(self, path: str, diff: ScanDiff) -> None:
+        folder, name = os.path.split(path)
+        cached = self.dirs.get(folder)
+        if cached is None or cached.ignored or not name.endswith(".py") or name.startswith("."):
+            return
+        st = self.__stat(path)
+        if st is None:
+            if cached.files.pop(name, None) is not None:
+                diff.removed.append(path)
+        elif name not in cached.files:
+            cached.files[name] = st.st_mtime_ns
+            diff.added.append(path)
+        elif cached.files[name] != st.st_mtime_ns:
+            cached.files[name] = st.st_mtime_ns
+            diff.modified.append(path)
+
+    def scan(self, paths: list[str] = None) -> ScanDiff:
+        """Without paths the whole cached tree is checked, otherwise only the given files and
+        directories. Directories given are re-listed, but their known sub folders aren't visited."""
+        self.stat_calls = 0
+        diff = ScanDiff()
+        if paths is None:
+            self.__scan_dir(self.folder, diff, True)
+            return diff
+        for path in paths:
+            if path in self.dirs:
+                self.__scan_dir(path, diff, False)
+            else:
+                self.__scan_file(path, diff)
+        return diff
+
+
+def module_name(full_path: str) -> str:
+    """Name other modules use to import this file, all plugin folders are import roots"""
+    path = pathlib.Path(full_path)
+    if path.name == "__init__.py":
+        return path.parent.name
+    return path.stem
+
+
+def parse_imports(source: str) -> set[str]:
+    """Top level names of all modules the source imports, relative imports are skipped"""
+    result = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            result.update(i.name.split(".")[0] for i in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            result.add(node.module.split(".")[0])
+    return result
+
+
+LAZY_BASE_TYPES = ("Operator", "Menu")
+"""Auto load classes of these types can be registered as proxies before their module is imported"""
+
+
+def read_manifest(source: bytes) -> dict:
+    """Reads what the loader needs to register proxies straight from the source, without running it.
+    eager is set when the module can't be loaded lazily, like classes with bpl_load or properties."""
+    eager = False
+    classes = []
+    for node in ast.parse(source).body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        values: dict[str, ast.expr] = {}
+        has_properties = False
+        for item in node.body:
+            if isinstance(item, ast.FunctionDef) and item.name == BPL_LOAD_FUNC:
+                eager = True
+            elif isinstance(item, ast.AnnAssign):
+                has_properties = True
+            elif isinstance(item, ast.Assign):
+                for target in item.targets:
+                    if isinstance(target, ast.Name):
+                        values[target.id] = item.value
+        if BPL_AUTO_LOAD_PROP not in values:
+            continue
+        base = node.bases[0] if len(node.bases) == 1 else None
+        base_name = base.attr if isinstance(base, ast.Attribute) else getattr(base, "id", None)
+        try:
+            bl_idname = ast.literal_eval(values["bl_idname"])
+            bl_label = ast.literal_eval(values["bl_label"])
+        except (KeyError, ValueError):
+            bl_idname = bl_label = None # not a plain string, only known after running the module
+        if base_name not in LAZY_BASE_TYPES or has_properties or not isinstance(bl_idname, str):
+            eager = True
+            continue
+        classes.append({
+            "name": node.name,
+            "base": base_name,
+            "bl_idname": bl_idname,
+            "bl_label": bl_label if isinstance(bl_label, str) else bl_idname,
+            "bl_description": ast.get_docstring(node) or "",
+        })
+    return {"eager": eager, "classes": classes}
+
+
+def make_proxy_class(info: dict, realize) -> type:
+    """Stand-in for an auto load class, realize(call) imports the real module outside of
+    any running operator or draw and then runs call"""
+    if info["base"] == "Menu":
+        def draw(self, _context: bpy.types.Context) -> None:
+            self.layout.label(text="Loading...")
+            realize(None)
+        return type(info["name"], (bpy.types.Menu,), {
+            "bl_idname": info["bl_idname"],
+            "bl_label": info["bl_label"],
+            "draw": draw,
+        })
+
+    def run_real_operator(context: bpy.types.Context, mode: str) -> set[str]:
+        overrides = {"window": context.window, "area": context.area, "region": context.region}
+        def call():
+            category, name = info["bl_idname"].split(".", 1)
+            operator = getattr(getattr(bpy.ops, category), name)
+            with bpy.context.temp_override(**{k: v for k, v in overrides.items() if v is not None}):
+                operator(mode)
+        realize(call)
+        return {'FINISHED'}
+
+    return type(info["name"], (bpy.types.Operator,), {
+        "__doc__": info["bl_description"],
+        "bl_idname": info["bl_idname"],
+        "bl_label": info["bl_label"],
+        "invoke": lambda self, context, _event: run_real_operator(context, 'INVOKE_DEFAULT'),
+        "execute": lambda self, context: run_real_operator(context, 'EXEC_DEFAULT'),
+    })
+
+
+def hash_file(full_path: str) -> str:
+    """Cheap content hash to tell real changes from touched files, None if it can't be read"""
+    try:
+        with open(full_path, "rb") as file:
+            return hashlib.blake2b(file.read(), digest_size=16).hexdigest()
+    except OSError:
+        return None
+
+
+def get_module_files(folder: str) -> list[str]:
+    """All .py files in the folder which are not in a .bplignore'd sub folder"""
+    return DirectoryScanner(folder).scan().added
+
+
+def get_cache_folder() -> str:
+    """Per user cache folder, outside of the repo so git never sees it"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~/AppData/Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, BPL_ADDON_ID)
+
+
+class CodeCache:
+    """Stores the compiled code and lazy load manifests of the sub-plugins keyed by their source, so unchanged
+    files skip compiling. Blender doesn't write .pyc files, so without this every start compiles everything."""
+
+    HEADER = struct.Struct("<d")
+    """Seconds it took to compile the entry, to report the time saved on a hit"""
+    MAX_AGE_DAYS = 30
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        """Compile time of the hits minus the time it took to load them"""
+        os.makedirs(self.folder, exist_ok=True)
+
+    def __entry_path(self, full_path: str, source: bytes) -> str:
+        key = hashlib.blake2b(digest_size=16)
+        key.update(importlib.util.MAGIC_NUMBER)
+        key.update(os.fsencode(full_path)) # the path is baked into the code object
+        key.update(source)
+        return os.path.join(self.folder, key.hexdigest() + ".bplc")
+
+    def get_code(self, full_path: str, source: bytes) -> types.CodeType:
+        entry_path = self.__entry_path(full_path, source)
+        start = time.perf_counter()
+        try:
+            with open(entry_path, "rb") as file:
+                data = file.read()
+            (compile_seconds,) = self.HEADER.unpack_from(data)
+            code = marshal.loads(memoryview(data)[self.HEADER.size:])
+            self.hits += 1
+            self.saved_seconds += max(0.0, compile_seconds - (time.perf_counter() - start))
+            os.utime(entry_path) # keep used entries from being pruned
+            return code
+        except (OSError, ValueError, EOFError, TypeError, struct.error):
+            pass
+
+        start = time.perf_counter()
+        code = compile(source, full_path, "exec", dont_inherit=True)
+        compile_seconds = time.perf_counter() - start
+        self.misses += 1
+        try:
+            temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(self.HEADER.pack(compile_seconds))
+                file.write(marshal.dumps(code))
+            os.replace(temp_path, entry_path)
+        except OSError as ex:
+            print(f"BPL failed to write code cache for {full_path}: {ex}")
+        return code
+
+    def get_manifest(self, source: bytes) -> dict:
+        key = hashlib.blake2b(source, digest_size=16, person=b"bpl manifest v1")
+        entry_path = os.path.join(self.folder, key.hexdigest() + ".json")
+        try:
+            with open(entry_path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            pass
+        manifest = read_manifest(source)
+        try:
+            temp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(manifest, file)
+            os.replace(temp_path, entry_path)
+        except OSError as ex:
+            print(f"BPL failed to write manifest cache: {ex}")
+        return manifest
+
+    def prune(self) -> None:
+        """Removes entries which weren't used for a while"""
+        oldest = time.time() - self.MAX_AGE_DAYS * 24 * 60 * 60
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < oldest:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
+    def summary(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = 100 * self.hits / total if total else 0
+        return (f"code cache hits {self.hits}/{total} ({hit_rate:.0f}%), "
+                f"saved {self.saved_seconds * 1000:.1f} ms")
+
+
+class RollingTimings:
+    """The most recent durations of something which happens repeatedly"""
+
+    def __init__(self, size: int = 500):
+        self.durations: collections.deque[float] = collections.deque(maxlen=size)
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.durations.append(seconds)
+        self.count += 1
+        self.total_seconds += seconds
+
+    def percentile(self, percent: float) -> float:
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        # nearest rank, the median of two samples is the smaller one and not the max
+        rank = math.ceil(len(ordered) * percent / 100)
+        return ordered[min(len(ordered), max(1, rank)) - 1]
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total_seconds * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": max(self.durations, default=0.0) * 1000,
+        }
+
+    def summary(self) -> str:
+        return (f"p50 {self.percentile(50) * 1000:.2f} ms, p95 {self.percentile(95) * 1000:.2f} ms, "
+                f"max {max(self.durations, default=0.0) * 1000:.2f} ms ({self.count} calls)")
+
+
+class ModuleTimings:
+    """How long the last load and unload of a module took, in seconds"""
+    __slots__ = ("import_seconds", "load_seconds", "register_seconds", "unload_seconds", "loads")
+
+    def __init__(self):
+        self.import_seconds = 0.0
+        """Executing the module, includes the modules it imported for the first time"""
+        self.load_seconds = 0.0
+        """bpl_load of all its loader classes"""
+        self.register_seconds = 0.0
+        self.unload_seconds = 0.0
+        """bpl_unload and unregistering"""
+        self.loads = 0
+
+    def total_seconds(self) -> float:
+        return self.import_seconds + self.load_seconds + self.register_seconds
+
+    def to_dict(self) -> dict:
+        return {
+            "import_ms": self.import_seconds * 1000,
+            "bpl_load_ms": self.load_seconds * 1000,
+            "register_ms": self.register_seconds * 1000,
+            "unload_ms": self.unload_seconds * 1000,
+            "loads": self.loads,
+        }
+
+
+class LoaderProfiler:
+    """Collects timings of the loader and the sub-plugins it runs"""
+
+    def __init__(self):
+        self.modules: dict[str, ModuleTimings] = {}
+        """Absolute file path to the timings of the module"""
+        self.ticks = RollingTimings()
+        """Duration of each check of the module manager on the main thread"""
+        self.timers: dict[str, RollingTimings] = {}
+        """Duration of the bpy.app.timers callbacks sub-plugins registered"""
+        self.wrapped_timers: dict[object, object] = {}
+        """Timer callback of a sub-plugin to the timed wrapper which got registered instead"""
+        self.timer_functions: tuple = None
+        """The original register, unregister and is_registered of bpy.app.timers while hooked"""
+        self.startup_seconds = 0.0
+
+    def module(self, full_path: str) -> ModuleTimings:
+        timings = self.modules.get(full_path)
+        if timings is None:
+            timings = self.modules[full_path] = ModuleTimings()
+        return timings
+
+    def wrap_timer(self, function):
+        if function in self.wrapped_timers:
+            return self.wrapped_timers[function]
+        name = f"{getattr(function, '__module__', '?')}.{getattr(function, '__qualname__', repr(function))}"
+        timings = self.timers.setdefault(name, RollingTimings())
+        @functools.wraps(function)
+        def timed():
+            start = time.perf_counter()
+            try:
+                return function()
+            finally:
+                timings.add(time.perf_counter() - start)
+        self.wrapped_timers[function] = timed
+        return timed
+
+    def hook_timers(self, should_time) -> None:
+        """Times the timers registered through bpy.app.timers for which should_time(function) is true.
+        A wrapper gets registered instead, unregister and is_registered map the function to it,
+        so the hooks have to stay until every sub-plugin is unloaded."""
+        if self.timer_functions is not None:
+            return
+        timers = bpy.app.timers
+        register, unregister, is_registered = timers.register, timers.unregister, timers.is_registered
+        self.timer_functions = (register, unregister, is_registered)
+        def timed_register(function, first_interval=0, persistent=False):
+            if should_time(function):
+                function = self.wrap_timer(function)
+            return register(function, first_interval=first_interval, persistent=persistent)
+        def timed_unregister(function):
+            return unregister(self.wrapped_timers.pop(function, function))
+        def timed_is_registered(function):
+            return is_registered(self.wrapped_timers.get(function, function))
+        timers.register, timers.unregister, timers.is_registered = (
+            timed_register, timed_unregister, timed_is_registered)
+
+    def unhook_timers(self) -> None:
+        if self.timer_functions is None:
+            return
+        timers = bpy.app.timers
+        timers.register, timers.unregister, timers.is_registered = self.timer_functions
+        self.timer_functions = None
+
+    def forget_timers(self, module: types.ModuleType) -> None:
+        """Drops the wrappers of an unloaded module, so the profiler doesn't keep it alive"""
+        for function in list(self.wrapped_timers):
+            if getattr(function, "__module__", None) == module.__name__:
+                del self.wrapped_timers[function]
+
+    def slowest_modules(self, count: int) -> list[tuple[str, ModuleTimings]]:
+        ordered = sorted(self.modules.items(), key=lambda i: i[1].total_seconds(), reverse=True)
+        return ordered[:count]
+
+    def to_dict(self) -> dict:
+        return {
+            "startup_ms": self.startup_seconds * 1000,
+            "ticks": self.ticks.to_dict(),
+            "modules": {path: timings.to_dict() for path, timings in self.modules.items()},
+            "timers": {name: timings.to_dict() for name, timings in self.timers.items()},
+        }
+
+
+def describe_object(obj: object) -> str:
+    if isinstance(obj, (types.FunctionType, types.MethodType)):
+        return f"function {obj.__module__}.{obj.__qualname__}"
+    if isinstance(obj, types.ModuleType):
+        return f"module {obj.__name__}"
+    if inspect.isclass(obj):
+        return f"class {obj.__module__}.{obj.__qualname__}"
+    if isinstance(obj, dict) and "__name__" in obj and "__builtins__" in obj:
+        return f"globals of {obj['__name__']}"
+    if isinstance(obj, types.CellType):
+        return "closure cell"
+    return type(obj).__name__
+
+
+def find_holders(obj: object, ignore: set[int], max_nodes: int = 30, limit: int = 5) -> list[str]:
+    """Reference chains keeping obj alive, from the outermost holder found down to obj.
+    gc.get_referrers walks every object, so only a few nodes are visited."""
+    handlers = {name: getattr(bpy.app.handlers, name) for name in dir(bpy.app.handlers) if not name.startswith("_")}
+    handler_lists = {id(value): f"bpy.app.handlers.{name}" for name, value in handlers.items() if isinstance(value, list)}
+    chains: list[str] = []
+    queue = collections.deque([[obj]])
+    visited = {id(obj)}
+    ignore = ignore | {id(queue), id(queue[0]), id(chains)}
+    nodes = 0
+    while queue and len(chains) < limit and nodes < max_nodes:
+        chain = queue.popleft()
+        nodes += 1
+        target = chain[-1]
+        extended = False
+        if id(target) not in handler_lists and not (isinstance(target, types.ModuleType) and target is not obj):
+            referrers = gc.get_referrers(target)
+            for holder in referrers:
+                if id(holder) in ignore or id(holder) in visited or inspect.isframe(holder):
+                    continue
+                visited.add(id(holder))
+                longer = chain + [holder]
+                ignore.add(id(longer))
+                queue.append(longer)
+                extended = True
+            del referrers
+        if extended or len(chain) == 1:
+            continue
+        names = [handler_lists.get(id(i)) or describe_object(i) for i in reversed(chain)]
+        if isinstance(target, (types.FunctionType, types.MethodType)) or inspect.isclass(target):
+            # no python referrers left, Blender holds it. Like timers, draw callbacks or registered classes
+            names[0] += " (held by Blender)"
+        elif not isinstance(target, types.ModuleType) and id(target) not in handler_lists:
+            continue # internals of a reference cycle, like the __mro__ of a class
+        chains.append(" -> ".join(names))
+    if not chains:
+        chains.append(f"{describe_object(obj)} (held outside of python)")
+    return chains
+
+
+class RetiredModule:
+    """A module generation which got unloaded, only referenced weakly to see if it gets freed"""
+    __slots__ = ("full_path", "generation", "cycle", "module", "classes", "holders")
+
+    def __init__(self, module: types.ModuleType, generation: int, cycle: int):
+        self.full_path: str = module.__file__
+        self.generation = generation
+        """How many times the file was loaded before, 1 for the first version"""
+        self.cycle = cycle
+        """Reload cycle it was unloaded in"""
+        self.module = weakref.ref(module)
+        self.classes = [weakref.ref(i) for i in vars(module).values()
+                        if inspect.isclass(i) and i.__module__ == module.__name__]
+        self.holders: list[str] = None
+        """What keeps it alive, only searched once it's known to leak"""
+
+    def alive_objects(self) -> list[object]:
+        return [i for i in (ref() for ref in [self.module] + self.classes) if i is not None]
+
+    def to_dict(self) -> dict:
+        return {"path": self.full_path, "generation": self.generation, "cycle": self.cycle,
+                "holders": self.holders or []}
+
+
+class ReloadCycle:
+    """Memory after one hot reload"""
+    __slots__ = ("number", "files", "alive", "leaked", "memory_bytes", "growth", "gc_seconds")
+
+    def __init__(self, number: int, files: int):
+        self.number = number
+        self.files = files
+        """Files reloaded or removed"""
+        self.alive: int = None
+        """Old generations of any cycle which are still alive, None if it wasn't checked"""
+        self.leaked: int = None
+        """Generations unloaded in this cycle which are still alive, None if it wasn't checked"""
+        self.memory_bytes: int = None
+        """Traced memory, None unless tracemalloc is running"""
+        self.growth: list[str] = []
+        """Source lines which allocated the most since the previous cycle"""
+        self.gc_seconds = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "number": self.number,
+            "files": self.files,
+            "alive": self.alive,
+            "leaked": self.leaked,
+            "memory_bytes": self.memory_bytes,
+            "growth": self.growth,
+            "gc_ms": self.gc_seconds * 1000,
+        }
+
+
+class LeakTracker:
+    """Tracks every unloaded module generation weakly and records memory after each reload"""
+
+    SNAPSHOT_FILTERS = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ]
+
+    def __init__(self):
+        self.generations: dict[str, int] = {}
+        """Absolute file path to how many versions were unloaded"""
+        self.retired: list[RetiredModule] = []
+        """Unloaded generations, freed ones get dropped after each cycle"""
+        self.cycles: collections.deque[ReloadCycle] = collections.deque(maxlen=50)
+        self.cycle = 0
+        self.strict = False
+        """Print a warning whenever a reload leaks"""
+        self.checked_cycle = -1
+        """Cycle the last leak check ran after"""
+        self.started_tracing = False
+        self.snapshot: tracemalloc.Snapshot = None
+
+    def start_tracing(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop_tracing(self) -> None:
+        self.snapshot = None
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def take_snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            return None
+        return tracemalloc.take_snapshot().filter_traces(self.SNAPSHOT_FILTERS)
+
+    def retire(self, module: types.ModuleType) -> None:
+        generation = self.generations.get(module.__file__, 0) + 1
+        self.generations[module.__file__] = generation
+        self.retired.append(RetiredModule(module, generation, self.cycle))
+
+    def check(self, result: ReloadCycle = None) -> int:
+        """Collects garbage and searches what holds the generations which are still alive.
+        Walks the whole heap, so it only runs after reloads when asked for. Returns how many are alive."""
+        start = time.perf_counter()
+        gc.collect()
+        retired = []
+        leaked = 0
+        for generation in self.retired:
+            alive = generation.alive_objects()
+            if not alive:
+                continue
+            retired.append(generation)
+            if generation.cycle == self.cycle:
+                leaked += 1
+            if generation.holders is None:
+                generation.holders = find_holders(alive[0], {id(alive), id(retired)})
+            del alive
+        self.retired = retired
+        self.checked_cycle = self.cycle
+        if result is not None:
+            result.gc_seconds = time.perf_counter() - start
+            result.leaked = leaked
+            result.alive = len(retired)
+        return len(retired)
+
+    def end_cycle(self, files: int) -> ReloadCycle:
+        """Call after a reload, checks for generations which are still alive if strict or
+        tracking memory, otherwise only drops the ones which are already freed"""
+        result = ReloadCycle(self.cycle, files)
+        if self.strict or self.started_tracing:
+            self.check(result)
+        else:
+            self.retired = [i for i in self.retired if i.alive_objects()]
+
+        if tracemalloc.is_tracing():
+            result.memory_bytes = tracemalloc.get_traced_memory()[0]
+            snapshot = self.take_snapshot()
+            if self.snapshot is not None:
+                result.growth = [str(i) for i in snapshot.compare_to(self.snapshot, "lineno")[:5] if 0 < i.size_diff]
+            self.snapshot = snapshot
+        self.cycles.append(result)
+        if self.strict and result.leaked:
+            print(f"BPL WARNING reload {self.cycle} leaked {result.leaked} module generations:")
+            for generation in self.retired:
+                if generation.cycle == self.cycle:
+                    print(f"  {generation.full_path} (generation {generation.generation})")
+                    for holder in generation.holders:
+                        print(f"    {holder}")
+        self.cycle += 1
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "alive": [i.to_dict() for i in self.retired],
+            "cycles": [i.to_dict() for i in self.cycles],
+        }
+
+
+class ValidatedFile:
+    """A changed file read and compiled off the main thread"""
+
+    def __init__(self, full_path: str):
+        self.full_path = full_path
+        self.source: bytes = None
+        """None if the file doesn't exist anymore"""
+        self.content_hash: str = None
+        self.code: types.CodeType = None
+        self.imports: set[str] = set()
+        self.error: Exception = None
+        """Set if the file can't be compiled, the previous version should stay loaded"""
+
+
+def validate_file(full_path: str, code_cache) -> ValidatedFile:
+    """Does the expensive part of a reload, safe to run in a background thread"""
+    result = ValidatedFile(full_path)
+    try:
+        with open(full_path, "rb") as file:
+            result.source = file.read()
+    except OSError:
+        return result
+    result.content_hash = hashlib.blake2b(result.source, digest_size=16).hexdigest()
+    try:
+        if code_cache is None:
+            result.code = compile(result.source, full_path, "exec", dont_inherit=True)
+        else:
+            result.code = code_cache.get_code(full_path, result.source)
+        result.imports = parse_imports(result.source)
+    except Exception as ex:
+        result.error = ex
+    return result
+
+
+def read_imports(files: dict[str, str]) -> dict[str, tuple[str, set[str]]]:
+    """Content hash and imports of each file, for files loaded without going through validate_file.
+    Safe to run in a background thread."""
+    result = {}
+    for full_path in files:
+        try:
+            with open(full_path, "rb") as file:
+                source = file.read()
+        except OSError:
+            continue
+        try:
+            names = parse_imports(source)
+        except (SyntaxError, ValueError):
+            names = set() # it will fail to load anyway
+        result[full_path] = (hashlib.blake2b(source, digest_size=16).hexdigest(), names)
+    return result
+
+
+class CachedSourceLoader(importlib.machinery.SourceFileLoader):
+    """Source loader which gets the code from the CodeCache instead of compiling"""
+
+    def __init__(self, fullname: str, path: str, finder: "ModuleFinder"):
+        super().__init__(fullname, path)
+        self.finder = finder
+
+    def get_code(self, fullname: str) -> types.CodeType:
+        source = self.get_data(self.path)
+        precompiled = self.finder.precompiled.pop(self.path, None)
+        if precompiled is not None and precompiled[0] == source:
+            return precompiled[1]
+        if self.finder.code_cache is None:
+            return compile(source, self.path, "exec", dont_inherit=True)
+        return self.finder.code_cache.get_code(self.path, source)
+
+    def exec_module(self, module: types.ModuleType) -> None:
+        start = time.perf_counter()
+        try:
+            super().exec_module(module)
+        finally:
+            if self.finder.profiler is not None:
+                self.finder.profiler.module(self.path).import_seconds = time.perf_counter() - start
+
+
+class ModuleFinder(importlib.abc.MetaPathFinder):
+    """Resolves imports of the sub-plugins from an index of the auto load folder, so the plugin
+    folders don't have to be added to sys.path which would slow down every other import.
+    It comes after the regular finders, names importable from sys.path aren't indexed."""
+
+    def __init__(self, code_cache: CodeCache, profiler: LoaderProfiler):
+        self.code_cache = code_cache
+        self.profiler = profiler
+        self.index: dict[str, list[str]] = {}
+        """Module name to the files providing it, only the first one can be imported"""
+        self.precompiled: dict[str, tuple[bytes, types.CodeType]] = {}
+        """Code compiled in the background for the next load of a file, only used if the source still matches"""
+
+    def add(self, full_path: str) -> None:
+        name = module_name(full_path)
+        if name not in self.index and self.is_taken(name, full_path):
+            print(f"BPL {full_path} can't be imported, there already is a module named {name}")
+            return
+        paths = self.index.setdefault(name, [])
+        if full_path not in paths:
+            paths.append(full_path)
+            paths.sort()
+        if len(paths) == 2:
+            print(f"BPL several files are named {name}, imports will use {paths[0]}")
+
+    @staticmethod
+    def is_taken(name: str, full_path: str) -> bool:
+        """Standard library, site-packages and other add-ons win, like they did while the plugin
+        folders were appended to sys.path. Otherwise a utils.py would replace every other utils."""
+        if name in sys.stdlib_module_names or name in sys.builtin_module_names:
+            return True
+        try:
+            spec = importlib.machinery.PathFinder.find_spec(name)
+        except (ImportError, ValueError):
+            return False
+        return spec is not None and os.path.normcase(spec.origin or "") != os.path.normcase(full_path)
+
+    def remove(self, full_path: str) -> None:
+        name = module_name(full_path)
+        paths = self.index.get(name, [])
+        if full_path in paths:
+            paths.remove(full_path)
+            if not paths:
+                del self.index[name]
+
+    def is_importable(self, full_path: str) -> bool:
+        paths = self.index.get(module_name(full_path))
+        return paths is not None and paths[0] == full_path
+
+    def spec_for(self, name: str, full_path: str) -> importlib.machinery.ModuleSpec:
+        locations = None
+        if os.path.basename(full_path) == "__init__.py":
+            locations = [os.path.dirname(full_path)]
+        return importlib.util.spec_from_file_location(
+            name, full_path, loader=CachedSourceLoader(name, full_path, self),
+            submodule_search_locations=locations)
+
+    def find_spec(self, fullname: str, path, target=None) -> importlib.machinery.ModuleSpec:
+        if path is not None:
+            return None # sub modules of packages are found through the package
+        paths = self.index.get(fullname)
+        if paths is None:
+            return None
+        return self.spec_for(fullname, paths[0])
+
+
+class PollingBackend:
+    """Fallback watcher backend, periodically checks the cached tree for changes"""
+
+    def __init__(self, scanner: DirectoryScanner, interval_seconds: float):
+        self.scanner = scanner
+        self.interval_seconds = interval_seconds
+
+    def wait_changes(self, stop: threading.Event) -> ScanDiff:
+        if stop.wait(self.interval_seconds):
+            return ScanDiff()
+        return self.scanner.scan()
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyBackend:
+    """Linux only, the kernel tells us what changed so we only re-scan those paths"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE
+                  | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+    STRUCTURE_MASK = IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE
+    """Events which change the listing of the watched directory"""
+    EVENT_HEADER = struct.Struct("iIII")
+    WAIT_SECONDS = 0.5
+    """How long to block in select, also how fast the thread notices it should stop"""
+
+    def __init__(self, scanner: DirectoryScanner):
+        self.scanner = scanner
+        self.watches: dict[int, str] = {}
+        """Watch descriptor to directory path"""
+        self.watched: dict[str, int] = {}
+        self.failed: OSError = None
+        """Set when watches couldn't be added, the watcher has to fall back to polling"""
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self.__sync_watches()
+        except Exception:
+            self.close()
+            raise
+
+    def __sync_watches(self) -> None:
+        """Watches exactly the directories the scanner knows about, ignored ones included"""
+        for path in self.scanner.dirs.keys() - self.watched.keys():
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+            self.watches[wd] = path
+            self.watched[path] = wd
+        for path in self.watched.keys() - self.scanner.dirs.keys():
+            wd = self.watched.pop(path)
+            self.watches.pop(wd, None)
+            self.libc.inotify_rm_watch(self.fd, wd)
+
+    def __read_events(self) -> list[str]:
+        """Returns the paths to re-scan, None if events were lost and everything has to be checked"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        dirty = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if mask & self.IN_IGNORED:
+                path = self.watches.pop(wd, None)
+                if path is not None and self.watched.get(path) == wd:
+                    del self.watched[path]
+                continue
+            folder = self.watches.get(wd)
+            if folder is None or not name:
+                continue
+            if mask & self.STRUCTURE_MASK:
+                dirty.append(folder)
+                # re-listing keeps the mtime of names it knew, a file replaced by a rename
+                # like editors do on save has to be checked itself
+                if not mask & self.IN_ISDIR:
+                    dirty.append(os.path.join(folder, name))
+            else:
+                dirty.append(os.path.join(folder, name))
+        return dirty
+
+    def catch_up(self) -> ScanDiff:
+        """The watches are added after the first scan listed the folders, changes in between
+        only show up when checking everything once more"""
+        diff = self.scanner.scan()
+        self.__sync_watches()
+        return diff
+
+    def wait_changes(self, stop: threading.Event) -> ScanDiff:
+        if stop.is_set():
+            return ScanDiff()
+        readable, _, _ = select.select([self.fd], [], [], self.WAIT_SECONDS)
+        if not readable:
+            return ScanDiff()
+        dirty = self.__read_events()
+        if dirty is not None and len(dirty) == 0:
+            return ScanDiff()
+        diff = self.scanner.scan(None if dirty is None else list(dict.fromkeys(dirty)))
+        try:
+            self.__sync_watches()
+        except OSError as ex:
+            # the scanner already moved on, the diff must not get lost
+            self.failed = ex
+        return diff
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class WatchSubscription:
+    """Returned by subscribe, pass it to unsubscribe"""
+    __slots__ = ("path", "callback")
+
+    def __init__(self, path: str, callback):
+        self.path = path
+        """Normalized absolute path, also what the callback gets called with"""
+        self.callback = callback
+
+
+class WatchService:
+    """Lets sub-plugins watch files or folders without their own timer. The paths are checked
+    from the file watcher thread, subscriptions to the same path share one stat call.
+    A folder only changes when entries get added, removed or renamed."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.subscriptions: dict[str, list[WatchSubscription]] = {}
+        """Normalized path to everyone watching it"""
+        self.signatures: dict[str, tuple[int, int, int, int]] = {}
+        """Modification time, size, inode and mode of each path as seen last, None if it didn't exist"""
+        self.changed: queue.SimpleQueue[str] = queue.SimpleQueue()
+        """Paths which changed, drained on the main thread"""
+
+    @staticmethod
+    def signature(path: str) -> tuple[int, int, int, int]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        # the mode tells about permission changes, like git lfs making locked files writable
+        return (st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode)
+
+    def subscribe(self, path: str, callback) -> WatchSubscription:
+        subscription = WatchSubscription(os.path.normcase(os.path.abspath(path)), callback)
+        with self.__lock:
+            if subscription.path not in self.subscriptions:
+                self.subscriptions[subscription.path] = []
+                self.signatures[subscription.path] = self.signature(subscription.path)
+            self.subscriptions[subscription.path].append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: WatchSubscription) -> None:
+        with self.__lock:
+            subscriptions = self.subscriptions.get(subscription.path, [])
+            if subscription in subscriptions:
+                subscriptions.remove(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.path, None)
+                self.signatures.pop(subscription.path, None)
+
+    def forget(self, module: types.ModuleType) -> None:
+        """Drops the subscriptions an unloaded module didn't remove itself"""
+        with self.__lock:
+            forgotten = [i for subscriptions in self.subscriptions.values() for i in subscriptions
+                         if getattr(i.callback, "__module__", None) == module.__name__]
+        for subscription in forgotten:
+            print(f"BPL {module.__name__} didn't unsubscribe from {subscription.path}")
+            self.unsubscribe(subscription)
+
+    def poll(self) -> int:
+        """Checks every watched path once, called from the watcher thread. Returns the number of stat calls."""
+        with self.__lock:
+            paths = list(self.subscriptions)
+        for path in paths:
+            signature = self.signature(path)
+            with self.__lock:
+                if path not in self.signatures or self.signatures[path] == signature:
+                    continue
+                self.signatures[path] = signature
+            self.changed.put(path)
+        return len(paths)
+
+    def dispatch(self) -> int:
+        """Calls back the subscribers of the changed paths, on the main thread"""
+        paths = []
+        while not self.changed.empty():
+            paths.append(self.changed.get_nowait())
+        for path in dict.fromkeys(paths):
+            with self.__lock:
+                subscriptions = list(self.subscriptions.get(path, []))
+            for subscription in subscriptions:
+                try:
+                    subscription.callback(path)
+                except Exception as ex:
+                    print(f"BPL watch callback for {path} failed")
+                    print(ex)
+        return len(paths)
+
+
+class FileWatcher:
+    """Runs a watcher backend in a background thread and pushes the changed files into a queue"""
+
+    def __init__(self, folder: str, interval_seconds: float):
+        self.scanner = DirectoryScanner(folder)
+        self.initial_files = self.scanner.scan().added
+        """Files found when the watcher was armed, changes after that are reported through the queue"""
+        self.changes: queue.SimpleQueue[ScanDiff] = queue.SimpleQueue()
+        """Drained on the main thread"""
+        self.service = WatchService()
+        """Paths sub-plugins watch, checked by the same thread"""
+        self.backend = None
+        if sys.platform.startswith("linux"):
+            try:
+                self.backend = InotifyBackend(self.scanner)
+            except Exception as ex:
+                print(f"BPL inotify not available, falling back to polling: {ex}")
+        if self.backend is None:
+            self.backend = PollingBackend(self.scanner, interval_seconds)
+        else:
+            diff = self.backend.catch_up()
+            if diff:
+                self.changes.put(diff)
+        self.interval_seconds = interval_seconds
+        self.stat_calls = self.scanner.stat_calls
+        """Number of stat calls the last tick of the watcher made"""
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, name="BPL FileWatcher", daemon=True)
+
+    def __run(self) -> None:
+        while not self.__stop.is_set():
+            try:
+                self.scanner.stat_calls = 0
+                diff = self.backend.wait_changes(self.__stop)
+                self.stat_calls = self.scanner.stat_calls + self.service.poll()
+                if diff:
+                    self.changes.put(diff)
+                if getattr(self.backend, "failed", None) is not None:
+                    # like running out of inotify watches, polling still sees everything
+                    print(f"BPL inotify failed, falling back to polling: {self.backend.failed}")
+                    self.backend.close()
+                    self.backend = PollingBackend(self.scanner, self.interval_seconds)
+            except Exception as ex:
+                print("BPL file watcher failed")
+                print(ex)
+                self.__stop.wait(1)
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def stop(self) -> None:
+        self.__stop.set()
+        if self.__thread.is_alive():
+            self.__thread.join(timeout=2)
+        self.backend.close()
+
+
 class ModuleManager:
     """Loads modules from file paths and keeps track of changes to reload them"""
 
-    files: dict[str, float] = {}
-    """Holds the absolute file path and a timestamp when the file was last changed"""
+    files: dict[str, str] = {}
+    """Holds the absolute file path and the hash of the content it was loaded with"""
     modules: dict[types.ModuleType, list[object]] = {}
     """Holds the module type and the "loader classes" with the "bpl_load" functions or "bpl_auto_load" """
+    imports: dict[str, tuple[str, set[str]]] = {}
+    """Holds the absolute file path, the content hash it was parsed at and the modules it imports"""
+    importers: dict[str, set[str]] = {}
+    """Module name to the files importing it, the reverse of imports"""
+    imports_job: concurrent.futures.Future = None
+    """Parses the imports of the files loaded at startup, results are like imports"""
     interval_seconds: float = 10
     """Interval to check for file changes"""
     folder: str = ""
@@ -51,59 +1251,129 @@ class ModuleManager:
     """Whether the debugger should start. TODO the debugger should be moved out here"""
     revert_on_reload = False
     """Whether to revert the current file on hot reload"""
+    watcher: FileWatcher = None
+    """Reports changed files from a background thread, None in background mode"""
+    settle_seconds: float = 0.5
+    """Changes are only applied once no file changed for this long"""
+    pending: dict[str, bool] = {}
+    """Reported files waiting to settle and whether they still exist"""
+    last_change_time: float = 0
+    """When the watcher last reported a change"""
+    code_cache: CodeCache = None
+    """Compiled code of unchanged modules, None to always compile"""
+    lazy_load = False
+    """Whether modules with only operators and menus are registered as proxies and imported on first use"""
+    lazy: dict[str, list[type]] = {}
+    """Holds the absolute file path of modules which aren't imported yet and their registered proxy classes"""
+    realized: set[str] = set()
+    """Lazy modules which got used, these stay loaded normally from now on"""
+    finder: ModuleFinder = None
+    """Makes the sub-plugins importable by their file name while the manager is running"""
+    validator: concurrent.futures.ThreadPoolExecutor = None
+    """Reads and compiles changed files before the main thread swaps them in"""
+    validation: concurrent.futures.Future = None
+    """Batch currently being validated, results are a dict of path to ValidatedFile"""
+    VALIDATION_POLL_SECONDS = 0.05
+    profiler: LoaderProfiler = None
+    """Timings of the loader and the sub-plugins"""
+    leak_tracker: LeakTracker = None
+    """Unloaded module generations and memory per reload"""
+    track_memory = False
+    """Whether tracemalloc runs to record the memory of each reload, slows down every allocation"""
     def __init__(self, folder: str, interval_seconds: float):
         self.interval_seconds = interval_seconds
         self.folder = folder
+        self.files = {}
+        self.modules = {}
+        self.imports = {}
+        self.importers = {}
+        self.pending = {}
+        self.lazy = {}
+        self.realized = set()
+        self.profiler = LoaderProfiler()
+        self.leak_tracker = LeakTracker()
 
-    def __get_files(self) -> list[str]:
-        pattern_ignore = os.path.join(self.folder, "**", ".bplignore")
-        result_ignore = []
-        for i in glob.glob(pattern_ignore, recursive=True):
-            result_ignore.append(os.path.dirname(i))
-
-        pattern = os.path.join(self.folder, "**", "*.py")
-        result = []
-        for i in glob.glob(pattern, recursive=True):
-            in_ignore = False
-            for j in result_ignore:
-                if i.find(j) != -1:
-                    in_ignore = True
-                    break
-            if not in_ignore:
-                result.append(i)
-        return result
+    def __load_proxies(self, full_module_path: str, source: bytes) -> int:
+        """Registers proxies for the module, -1 if it has to be loaded right away"""
+        if self.code_cache is None:
+            manifest = read_manifest(source)
+        else:
+            manifest = self.code_cache.get_manifest(source)
+        if manifest["eager"] or not manifest["classes"]:
+            return -1
+        realize = lambda call: self.__realize_later(full_module_path, call)
+        proxies = []
+        self.lazy[full_module_path] = proxies
+        for info in manifest["classes"]:
+            proxy = make_proxy_class(info, realize)
+            bpy.utils.register_class(proxy)
+            proxies.append(proxy)
+        return len(proxies)
+
+    def __realize_later(self, full_module_path: str, call) -> None:
+        def realize():
+            if full_module_path in self.lazy:
+                print(f"BPL importing lazy module: {full_module_path}")
+                self.realized.add(full_module_path)
+                self.__unload_file(full_module_path)
+                self.__load_module(full_module_path)
+            if call is not None:
+                call()
+            return None
+        bpy.app.timers.register(realize, first_interval=0)
 
     def __load_module(self, full_module_path: str) -> int:
         loaded_count = 0
+        module = None
         try:
             path = pathlib.Path(full_module_path)
             if not path.is_file:
                 print(f"BPL Filed to load {full_module_path}, not a .py file")
                 return
-            file_name = path.with_suffix("").name
-            folder = str(path.parent)
-
-            if folder not in sys.path:
-                # print(f"BPL Added {folder} to sys.path")
-                sys.path.append(folder)
+            if self.lazy_load and full_module_path not in self.realized:
+                with open(full_module_path, "rb") as file:
+                    source = file.read()
+                loaded_count = self.__load_proxies(full_module_path, source)
+                if loaded_count != -1:
+                    return loaded_count
+                loaded_count = 0
 
-            spec = importlib.util.spec_from_file_location(
-                file_name, full_module_path)
-            module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(module)
+            name = module_name(full_module_path)
+            importable = self.finder.is_importable(full_module_path)
+            module = sys.modules.get(name) if importable else None
+            if getattr(module, "__file__", None) != full_module_path:
+                # not imported by another sub-plugin already
+                spec = self.finder.spec_for(name, full_module_path)
+                module = importlib.util.module_from_spec(spec)
+                if importable:
+                    if name in sys.modules:
+                        print(f"BPL {full_module_path} replaces the already imported module {name}")
+                    sys.modules[name] = module
+                try:
+                    spec.loader.exec_module(module)
+                except BaseException:
+                    if sys.modules.get(name) is module:
+                        del sys.modules[name]
+                    raise
 
             if module not in self.modules:
                 self.modules[module] = []
 
+            timings = self.profiler.module(full_module_path)
+            timings.loads += 1
+            timings.load_seconds = 0.0
+            timings.register_seconds = 0.0
             for name in dir(module):
                 attr = getattr(module, name)
                 if not inspect.isclass(attr):
                     continue
 
+                start = time.perf_counter()
                 if hasattr(attr, BPL_AUTO_LOAD_PROP):
                     bpy.utils.register_class(attr)
                     self.modules[module].append(attr)
                     loaded_count += 1
+                    timings.register_seconds += time.perf_counter() - start
                     # print(f"BPL auto loaded module: {module.__name__} {attr.__name__}")
                 elif hasattr(attr, BPL_LOAD_FUNC):
                     load_func = getattr(attr, BPL_LOAD_FUNC)
@@ -111,6 +1381,7 @@ class ModuleManager:
                     load_func()
                     self.modules[module].append(attr)
                     loaded_count += 1
+                    timings.load_seconds += time.perf_counter() - start
                     # print(f"BPL loaded module: {module.__name__} {attr.__name__}")
         except Exception as ex:
             print("BPL Failed to load " + full_module_path)
@@ -123,6 +1394,7 @@ class ModuleManager:
     def __unload_module(self, module: types.ModuleType) -> None:
         if module not in self.modules:
             return
+        start = time.perf_counter()
         for loader_class in self.modules[module]:
             if hasattr(loader_class, BPL_AUTO_LOAD_PROP):
                 bpy.utils.unregister_class(loader_class)
@@ -130,79 +1402,282 @@ class ModuleManager:
                 unload_func = getattr(loader_class, BPL_UNLOAD_FUNC)
                 unload_func()
         del self.modules[module]
+        self.profiler.module(module.__file__).unload_seconds = time.perf_counter() - start
+        self.profiler.forget_timers(module)
+        if self.watcher is not None:
+            self.watcher.service.forget(module)
+        self.leak_tracker.retire(module)
 
-        for key, value  in sys.modules.items():
-            # We can't use the name directly because it's missing package prefixes
-            # which are not respected in importlib
-            if not hasattr(value, "__file__"):
-                continue
-            if value.__file__ == module.__file__:
-                del sys.modules[key]
-                break
+        if sys.modules.get(module.__name__) is module:
+            del sys.modules[module.__name__]
         del module # just to be sure?
 
-    def __reload(self, full_path: str) -> int:
+    def __unload_file(self, full_path: str) -> None:
+        for proxy in self.lazy.pop(full_path, []):
+            bpy.utils.unregister_class(proxy)
         for module in self.modules.copy().keys():
-            loaded_file = module.__file__
-            if loaded_file == full_path:
-                if len(self.modules[module]) == 0:
-                    return -1
+            if module.__file__ == full_path:
                 self.__unload_module(module)
-        print(f"BPL reloading module: {full_path}")
-        return self.__load_module(full_path)
+        # lazy or failed modules might still have been imported by other sub-plugins
+        name = module_name(full_path)
+        if getattr(sys.modules.get(name), "__file__", None) == full_path:
+            del sys.modules[name]
+
+    def __set_imports(self, full_path: str, content_hash: str, names: set[str]) -> None:
+        self.__forget_imports(full_path)
+        self.imports[full_path] = (content_hash, names)
+        for name in names:
+            self.importers.setdefault(name, set()).add(full_path)
+
+    def __forget_imports(self, full_path: str) -> None:
+        old = self.imports.pop(full_path, None)
+        if old is None:
+            return
+        for name in old[1]:
+            importers = self.importers.get(name)
+            if importers is not None:
+                importers.discard(full_path)
+                if not importers:
+                    del self.importers[name]
+
+    def __merge_imports_job(self) -> None:
+        if self.imports_job is None or not self.imports_job.done():
+            return
+        try:
+            for full_path, (content_hash, names) in self.imports_job.result().items():
+                cached = self.imports.get(full_path)
+                if self.files.get(full_path) == content_hash and (cached is None or cached[0] != content_hash):
+                    self.__set_imports(full_path, content_hash, names)
+        except Exception as ex:
+            print(f"BPL parsing imports failed: {ex}")
+        self.imports_job = None
+
+    def __update_imports(self) -> None:
+        """Parses the files whose imports aren't known yet, usually the background job did already"""
+        self.__merge_imports_job()
+        outdated = {full_path: content_hash for full_path, content_hash in self.files.items()
+                    if self.imports.get(full_path, (None,))[0] != content_hash}
+        for full_path, (content_hash, names) in read_imports(outdated).items():
+            self.__set_imports(full_path, content_hash, names)
+
+    def __get_dependents(self, full_path: str) -> set[str]:
+        """The files which import full_path"""
+        return {i for i in self.importers.get(module_name(full_path), ()) if i != full_path and i in self.files}
+
+    def __get_reload_order(self, changed: list[str]) -> list[str]:
+        """The changed files and everything depending on them, dependencies first"""
+        self.__update_imports()
+        dependents = {}
+        affected = set()
+        stack = list(changed)
+        while stack:
+            full_path = stack.pop()
+            if full_path not in affected:
+                affected.add(full_path)
+                dependents[full_path] = self.__get_dependents(full_path)
+                stack.extend(dependents[full_path])
+
+        waiting_for = {i: set() for i in affected}
+        for full_path in affected:
+            for dependent in dependents.get(full_path, ()):
+                waiting_for[dependent].add(full_path)
+        order = []
+        ready = sorted(i for i, dependencies in waiting_for.items() if not dependencies)
+        while ready:
+            full_path = ready.pop(0)
+            order.append(full_path)
+            for dependent in sorted(dependents.get(full_path, ())):
+                waiting_for[dependent].discard(full_path)
+                if not waiting_for[dependent] and dependent not in order:
+                    ready.append(dependent)
+        # import cycles, load the rest in a stable order
+        order.extend(sorted(affected.difference(order)))
+        return order
+
+    def __reload(self, changed: list[str], removed: list[str]) -> int:
+        """Reloads the changed files and all modules importing them, unloads the removed files"""
+        order = self.__get_reload_order(changed + removed)
+        # dependents first, so their bpl_unload can still use what they import
+        for full_path in reversed(order):
+            self.__unload_file(full_path)
+        reload_count = 0
+        for full_path in order:
+            if full_path in removed:
+                print(f"BPL unloaded removed module: {full_path}")
+                self.finder.remove(full_path)
+                del self.files[full_path]
+                self.__forget_imports(full_path)
+                self.realized.discard(full_path)
+                continue
+            print(f"BPL reloading module: {full_path}")
+            reload_count += self.__load_module(full_path)
+        return reload_count
+
+    def __is_plugin_function(self, function) -> bool:
+        module = sys.modules.get(getattr(function, "__module__", None) or "")
+        return getattr(module, "__file__", None) in self.files
+
+    def __load_all(self, files: list[str] = None) -> int:
+        files = get_module_files(self.folder) if files is None else files
+        for full_path in files:
+            content_hash = hash_file(full_path)
+            if content_hash is not None:
+                self.files[full_path] = content_hash
+                # index everything first, so modules can import each other in any order
+                self.finder.add(full_path)
+        loaded_count = 0
+        for full_path in files:
+            if full_path in self.files:
+                loaded_count += self.__load_module(full_path)
+        return loaded_count
 
     @persistent
     def __check(self):
+        start = time.perf_counter()
+        try:
+            return self.__tick()
+        finally:
+            self.profiler.ticks.add(time.perf_counter() - start)
+
+    def __tick(self) -> float:
         if (self.debugger) and hasattr(bpy.ops, "debug"):
             try:
                 bpy.ops.debug.connect_debugger_vscode()
                 self.debugger = False
             except Exception:
                 pass
-        loaded_count = 0
-        reload_count = 0
-        for full_path in self.__get_files():
-            current_modified_time = os.path.getmtime(full_path)
-            if full_path in self.files:
-                if current_modified_time != self.files[full_path]:
-                    result = self.__reload(full_path)
-                    if result == -1:
-                        # until dependencies are tracked, we need a full reload
-                        print("BPL full reload needed.")
-                        self.unload_all()
-                        return 0
-                    reload_count += result
+        if self.watcher is None:
+            return self.interval_seconds
+        self.watcher.service.dispatch()
+        self.__merge_imports_job()
+        while not self.watcher.changes.empty():
+            diff: ScanDiff = self.watcher.changes.get_nowait()
+            for full_path in diff.removed:
+                self.pending[full_path] = False
+            for full_path in diff.added + diff.modified:
+                self.pending[full_path] = True
+            self.last_change_time = max(self.last_change_time, diff.time)
+        if self.validation is not None:
+            if not self.validation.done():
+                return self.VALIDATION_POLL_SECONDS
+            self.__apply_batch(self.validation.result())
+            self.validation = None
+        if not self.pending:
+            return self.interval_seconds
+        # editors and git write in several steps, wait until things calmed down
+        wait_seconds = self.last_change_time + self.settle_seconds - time.monotonic()
+        if 0 < wait_seconds:
+            return min(wait_seconds, self.interval_seconds)
+
+        pending = sorted(self.pending)
+        self.pending = {}
+        code_cache = self.code_cache
+        self.validation = self.validator.submit(
+            lambda: {i: validate_file(i, code_cache) for i in pending})
+        return self.VALIDATION_POLL_SECONDS
+
+    def __apply_batch(self, results: dict[str, ValidatedFile]) -> None:
+        """Swaps in the files which compiled, broken files keep their previous version loaded"""
+        added = []
+        changed = []
+        removed = []
+        for full_path, result in results.items():
+            if result.source is None:
+                if full_path in self.files:
+                    removed.append(full_path)
+                continue
+            if result.error is not None:
+                print(f"BPL skipped {full_path} until it compiles, the previous version stays loaded:")
+                print(result.error)
+                continue
+            if full_path not in self.files:
+                added.append(full_path)
+                self.finder.add(full_path)
+            elif result.content_hash != self.files[full_path]:
+                changed.append(full_path)
             else:
-                loaded_count += self.__load_module(full_path)
-            self.files[full_path] = current_modified_time
+                continue
+            self.files[full_path] = result.content_hash
+            self.__set_imports(full_path, result.content_hash, result.imports)
+            self.finder.precompiled[full_path] = (result.source, result.code)
+
+        reload_count = 0
+        if changed or removed:
+            reload_count = self.__reload(changed, removed)
+        loaded_count = 0
+        for full_path in added:
+            loaded_count += self.__load_module(full_path)
         if reload_count != 0 and self.revert_on_reload:
             try:
                 bpy.ops.wm.revert_mainfile()
             except Exception:
                 pass
+        self.finder.precompiled.clear()
+        if changed or removed:
+            cycle = self.leak_tracker.end_cycle(len(changed) + len(removed))
+            if cycle.alive:
+                print(f"BPL {cycle.alive} unloaded module generations are still alive")
         if (reload_count + loaded_count) != 0:
             print(f"BPL loaded {loaded_count} modules and reloaded {reload_count}.")
-        return self.interval_seconds
+            if self.code_cache is not None:
+                print(f"BPL {self.code_cache.summary()}")
 
 
     def start_watching(self) -> None:
+        start = time.perf_counter()
+        if self.track_memory:
+            self.leak_tracker.start_tracing()
+        self.finder = ModuleFinder(self.code_cache, self.profiler)
+        sys.meta_path.append(self.finder)
+        self.profiler.hook_timers(self.__is_plugin_function)
         if not bpy.app.background:
+            # arm the watcher before loading, changes while loading get reported by the first check
+            self.watcher = FileWatcher(self.folder, self.interval_seconds)
+        loaded_count = self.__load_all(None if self.watcher is None else self.watcher.initial_files)
+        self.profiler.startup_seconds = time.perf_counter() - start
+        print(f"BPL loaded {loaded_count} modules in {self.profiler.startup_seconds * 1000:.0f} ms.")
+        if self.code_cache is not None:
+            print(f"BPL {self.code_cache.summary()}")
+            self.code_cache.prune()
+        self.leak_tracker.snapshot = self.leak_tracker.take_snapshot()
+        if self.watcher is not None:
+            self.validator = concurrent.futures.ThreadPoolExecutor(1, "BPL Validator")
+            # the first reload needs to know what imports what, don't parse every file then
+            files = dict(self.files)
+            self.imports_job = self.validator.submit(lambda: read_imports(files))
+            self.watcher.start()
             bpy.app.timers.register(
                 function=self.__check, first_interval=self.interval_seconds, persistent=True)
-        self.__check()
 
     def stop_watching(self) -> None:
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        if self.validator is not None:
+            self.validator.shutdown(wait=False, cancel_futures=True)
+            self.validator = None
+            self.validation = None
+            self.imports_job = None
         try:
             if not bpy.app.background:
                 bpy.app.timers.unregister(self.__check)
         except Exception:
             pass
+        self.leak_tracker.stop_tracing()
 
     def unload_all(self) -> None:
+        for full_path in list(self.lazy):
+            self.__unload_file(full_path)
         for module, _loader in self.modules.copy().items():
             self.__unload_module(module)
         self.files = {}
         self.modules = {}
+        self.imports = {}
+        self.importers = {}
+        if self.finder in sys.meta_path:
+            sys.meta_path.remove(self.finder)
+        # after the unloads, bpl_unload unregisters the timers it registered
+        self.profiler.unhook_timers()
 
 
 BPL_MANAGER: ModuleManager = None
@@ -219,6 +1694,24 @@ class BPL_Preferences(AddonPreferences):
         name="Auto start Python debugger")
     revert_on_reload: bpy.props.BoolProperty(
         name="Revert File on Hot Reload", description="Restore original blend state when a python module is reloaded for faster debugging.")
+    lazy_load: bpy.props.BoolProperty(
+        name="Lazy Load Operators",
+        description="Register operators and menus from their source and only import the module when first used. "
+                    "Modules with bpl_load or properties are still loaded at startup")
+    use_code_cache: bpy.props.BoolProperty(
+        name="Cache Compiled Modules", default=True,
+        description="Keep the compiled sub-plugins in the user cache folder so unchanged files load faster")
+    reload_settle_seconds: bpy.props.FloatProperty(
+        name="Hot Reload Delay", default=0.5, min=0, max=10, subtype='TIME_ABSOLUTE', unit='TIME_ABSOLUTE',
+        description="Wait until no file changed for this long, so saves and git pulls are reloaded in one go")
+    track_reload_memory: bpy.props.BoolProperty(
+        name="Track Reload Memory",
+        description="Record memory after each hot reload with tracemalloc and show what grew. "
+                    "Makes everything a bit slower, restart blender after changing")
+    strict_reload: bpy.props.BoolProperty(
+        name="Warn on Reload Leaks",
+        description="Print a warning with what holds on to them when unloaded modules aren't freed after a reload. "
+                    "Collects garbage and walks every python object after each reload")
 
     def draw(self, _context):
         layout = self.layout
@@ -226,16 +1719,73 @@ class BPL_Preferences(AddonPreferences):
         layout.prop(self, "stuntboost_repo_path")
         layout.prop(self, "autostart_py_debugger")
         layout.prop(self, "revert_on_reload")
+        layout.prop(self, "reload_settle_seconds")
+        layout.prop(self, "use_code_cache")
+        layout.prop(self, "lazy_load")
+        layout.prop(self, "track_reload_memory")
+        layout.prop(self, "strict_reload")
         layout.separator()
         layout.label(text="Loaded Modules")
+        if BPL_MANAGER is not None and BPL_MANAGER.watcher is not None:
+            watcher = BPL_MANAGER.watcher
+            layout.label(text=f"Watching with {type(watcher.backend).__name__}, "
+                         f"last tick made {watcher.stat_calls} stat calls, "
+                         f"{len(watcher.service.subscriptions)} paths watched for sub-plugins")
+        if BPL_MANAGER is not None and BPL_MANAGER.code_cache is not None:
+            layout.label(text=BPL_MANAGER.code_cache.summary().capitalize())
         if BPL_MANAGER is not None:
+            profiler = BPL_MANAGER.profiler
             for module, _loader in BPL_MANAGER.modules.items():
-                layout.label(text=module.__file__)
+                timings = profiler.module(module.__file__)
+                row = layout.row()
+                row.label(text=module.__file__)
+                row.label(text=f"import {timings.import_seconds * 1000:.1f} ms, "
+                          f"bpl_load {timings.load_seconds * 1000:.1f} ms, "
+                          f"register {timings.register_seconds * 1000:.1f} ms")
+            for full_path in BPL_MANAGER.lazy:
+                layout.label(text=f"{full_path} (not imported yet)")
+
+            layout.separator()
+            layout.label(text="Profiling")
+            layout.label(text=f"Startup {profiler.startup_seconds * 1000:.0f} ms")
+            layout.label(text=f"BPL check: {profiler.ticks.summary()}")
+            for name, timings in profiler.timers.items():
+                layout.label(text=f"{name}: {timings.summary()}")
+            layout.operator(BPL_DumpProfile.bl_idname)
+
+            tracker = BPL_MANAGER.leak_tracker
+            layout.separator()
+            layout.label(text=f"Hot Reloads: {tracker.cycle}, "
+                         f"unloaded generations still alive: {len(tracker.retired)}")
+            for cycle in list(tracker.cycles)[-5:]:
+                memory = "" if cycle.memory_bytes is None else f", {cycle.memory_bytes / 1024 / 1024:.1f} MiB traced"
+                leaked = "not checked" if cycle.leaked is None else f"{cycle.leaked} leaked"
+                layout.label(text=f"Reload {cycle.number}: {cycle.files} files, {leaked}{memory}")
+            layout.operator(BPL_FindReloadLeaks.bl_idname)
+            if tracker.checked_cycle < tracker.cycle - 1:
+                return # generations which weren't checked might just be waiting for the garbage collector
+            for generation in tracker.retired:
+                layout.label(text=f"{generation.full_path} generation {generation.generation} is still alive")
+                for holder in (generation.holders or [])[:1]:
+                    layout.label(text=f"    held by {holder}")
 
 def get_repo_path() -> str:
     """THIS IS REFERENCED FROM OTHER ADDONS"""
     return bpy.context.preferences.addons[BPL_ADDON_ID].preferences.stuntboost_repo_path
 
+def subscribe(path: str, callback) -> WatchSubscription:
+    """THIS IS REFERENCED FROM OTHER ADDONS
+    Calls callback(path) on the main thread whenever the file or folder changes, path is normalized.
+    Returns None if nothing is watched, like in background mode."""
+    if BPL_MANAGER is None or BPL_MANAGER.watcher is None:
+        return None
+    return BPL_MANAGER.watcher.service.subscribe(path, callback)
+
+def unsubscribe(subscription: WatchSubscription) -> None:
+    """THIS IS REFERENCED FROM OTHER ADDONS"""
+    if subscription is not None and BPL_MANAGER is not None and BPL_MANAGER.watcher is not None:
+        BPL_MANAGER.watcher.service.unsubscribe(subscription)
+
 class BPL_Reload(bpy.types.Operator):
     """Reload all modules"""
     bl_idname = "wm.bpl_reload"
@@ -247,6 +1797,54 @@ class BPL_Reload(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class BPL_FindReloadLeaks(bpy.types.Operator):
+    """Collect garbage and search what keeps unloaded modules alive. Walks every python object, might take a while"""
+    bl_idname = "wm.bpl_find_reload_leaks"
+    bl_label = "Find Reload Leaks"
+
+    def execute(self, _context: bpy.types.Context):
+        if BPL_MANAGER is None:
+            self.report({'WARNING'}, "BPL is not running")
+            return {'CANCELLED'}
+        alive = BPL_MANAGER.leak_tracker.check()
+        self.report({'INFO'}, f"{alive} unloaded module generations are still alive")
+        return {'FINISHED'}
+
+
+class BPL_DumpProfile(bpy.types.Operator):
+    """Write the loader timings to a JSON file"""
+    bl_idname = "wm.bpl_dump_profile"
+    bl_label = "Save BPL Profile as JSON"
+
+    filepath: bpy.props.StringProperty(subtype='FILE_PATH')
+
+    def invoke(self, context: bpy.types.Context, _event):
+        if not self.filepath:
+            self.filepath = "bpl_profile.json"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+    def execute(self, _context: bpy.types.Context):
+        if BPL_MANAGER is None:
+            self.report({'WARNING'}, "BPL is not running")
+            return {'CANCELLED'}
+        result = BPL_MANAGER.profiler.to_dict()
+        if BPL_MANAGER.watcher is not None:
+            result["watcher_stat_calls"] = BPL_MANAGER.watcher.stat_calls
+        if BPL_MANAGER.code_cache is not None:
+            result["code_cache"] = {
+                "hits": BPL_MANAGER.code_cache.hits,
+                "misses": BPL_MANAGER.code_cache.misses,
+                "saved_ms": BPL_MANAGER.code_cache.saved_seconds * 1000,
+            }
+        BPL_MANAGER.leak_tracker.check()
+        result["reloads"] = BPL_MANAGER.leak_tracker.to_dict()
+        with open(bpy.path.abspath(self.filepath), "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+        self.report({'INFO'}, f"Saved BPL profile to {self.filepath}")
+        return {'FINISHED'}
+
+
 def start_bpl() -> None:
     global BPL_MANAGER
     preferences: BPL_Preferences = bpy.context.preferences.addons[BPL_ADDON_ID].preferences
@@ -258,6 +1856,15 @@ def start_bpl() -> None:
     BPL_MANAGER = ModuleManager(auto_load_path, 1)
     BPL_MANAGER.debugger = preferences.autostart_py_debugger
     BPL_MANAGER.revert_on_reload = preferences.revert_on_reload
+    BPL_MANAGER.settle_seconds = preferences.reload_settle_seconds
+    BPL_MANAGER.lazy_load = preferences.lazy_load
+    BPL_MANAGER.track_memory = preferences.track_reload_memory
+    BPL_MANAGER.leak_tracker.strict = preferences.strict_reload
+    if preferences.use_code_cache:
+        try:
+            BPL_MANAGER.code_cache = CodeCache(os.path.join(get_cache_folder(), "code"))
+        except OSError as ex:
+            print(f"BPL code cache disabled: {ex}")
     BPL_MANAGER.start_watching()
 
 
@@ -272,12 +1879,20 @@ def stop_bpl_and_unload() -> None:
 
 
 def register():
+    # sub-plugins import the loader by its id, also when it's installed as an extension
+    sys.modules.setdefault(BPL_ADDON_ID, sys.modules[__name__])
     bpy.utils.register_class(BPL_Preferences)
     bpy.utils.register_class(BPL_Reload)
+    bpy.utils.register_class(BPL_FindReloadLeaks)
+    bpy.utils.register_class(BPL_DumpProfile)
     start_bpl()
 
 
 def unregister():
     stop_bpl_and_unload()
+    if __name__ != BPL_ADDON_ID and sys.modules.get(BPL_ADDON_ID) is sys.modules[__name__]:
+        del sys.modules[BPL_ADDON_ID]
     bpy.utils.unregister_class(BPL_Preferences)
     bpy.utils.unregister_class(BPL_Reload)
+    bpy.utils.unregister_class(BPL_FindReloadLeaks)
+    bpy.utils.unregister_class(BPL_DumpProfile)